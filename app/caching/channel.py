@@ -0,0 +1,95 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Callable, Union
+from asyncio import Task, Event, sleep, gather, get_running_loop
+from logging import getLogger
+
+# 3rd party:
+from asyncpg import connect, Connection as BaseConnection
+
+# Internal:
+from app.database import Connection
+from app.database.postgres import CONN_STR
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'NotifyChannel'
+]
+
+
+logger = getLogger("app")
+
+NOTIFY = "SELECT pg_notify($1, $2)"
+
+MessageHandler = Callable[[str], None]
+
+
+class NotifyChannel:
+    """
+    Postgres ``LISTEN`` / ``NOTIFY`` channel.
+
+    Messages are received through a dedicated connection - outside the
+    pool - which is re-established with an exponential backoff if it is
+    lost. Messages are sent over pooled connections.
+    """
+    def __init__(self, channel: str, on_message: MessageHandler, conn_str: str = CONN_STR,
+                 retry_initial: float = 1, retry_max: float = 60):
+        self.channel = channel
+        self.on_message = on_message
+        self.conn_str = conn_str
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._task: Union[Task, None] = None
+
+    def _receive(self, conn: BaseConnection, pid: int, channel: str, payload: str):
+        try:
+            self.on_message(payload)
+        except Exception as err:
+            logger.exception(err)
+
+    async def _listen(self):
+        closed = Event()
+        conn = await connect(self.conn_str)
+
+        try:
+            conn.add_termination_listener(lambda _: closed.set())
+            await conn.add_listener(self.channel, self._receive)
+            logger.info(f"Listening to '{self.channel}' notifications.")
+
+            await closed.wait()
+        finally:
+            if not conn.is_closed():
+                await conn.close()
+
+    async def _run(self):
+        delay = self.retry_initial
+
+        while True:
+            try:
+                await self._listen()
+                delay = self.retry_initial
+            except Exception as err:
+                logger.warning(f"Lost '{self.channel}' notifications - retrying in {delay}s: {err}")
+
+            await sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+
+    def start(self):
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        task, self._task = self._task, None
+        task.cancel()
+        await gather(task, return_exceptions=True)
+
+    async def publish(self, payload: str):
+        async with Connection() as conn:
+            await conn.execute(NOTIFY, self.channel, payload)
@@ -0,0 +1,282 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import AsyncIterator, Union
+from asyncio import get_running_loop
+from contextlib import asynccontextmanager, suppress
+from hashlib import blake2b
+from os import scandir, unlink, utime, getpid, path
+from shutil import rmtree
+from uuid import uuid4
+from logging import getLogger
+
+# 3rd party:
+from aiofiles import open as aio_open, os as aio_os
+from aiofiles.threadpool.binary import AsyncBufferedIOBase
+
+# Internal:
+from app.config import Settings
+from app.utils.releases import release_watcher
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'DiskCache',
+    'disk_cache'
+]
+
+
+logger = getLogger("app")
+
+MARKER_SUFFIX = ".marker"
+TEMP_PREFIX = ".tmp-"
+
+
+class DiskCacheWriter:
+    def __init__(self, file_path: str, fp: AsyncBufferedIOBase):
+        self.file_path = file_path
+        self.size = 0
+        self._fp = fp
+
+    @classmethod
+    async def open(cls, file_path: str) -> 'DiskCacheWriter':
+        temp_path = path.join(path.dirname(file_path), f"{TEMP_PREFIX}{getpid()}-{uuid4().hex}")
+        return cls(file_path, await aio_open(temp_path, "wb"))
+
+    @property
+    def temp_path(self) -> str:
+        return self._fp.name
+
+    async def write(self, data: bytes):
+        await self._fp.write(data)
+        self.size += len(data)
+
+    async def commit(self):
+        await self._fp.close()
+        await aio_os.replace(self.temp_path, self.file_path)
+
+    async def discard(self):
+        await self._fp.close()
+
+        with suppress(FileNotFoundError):
+            await aio_os.unlink(self.temp_path)
+
+
+def scan_and_evict(directory: str, max_size: int) -> int:
+    """
+    Removes the least recently used entries of ``directory`` until
+    it is no larger than ``max_size`` bytes, and returns its size.
+    Blocking - to be run in an executor.
+    """
+    entries = list()
+    total_size = 0
+
+    with suppress(FileNotFoundError):
+        for entry in scandir(directory):
+            if entry.name.startswith(TEMP_PREFIX):
+                continue
+
+            with suppress(FileNotFoundError):
+                stats = entry.stat()
+                entries.append((stats.st_mtime, stats.st_size, entry.path))
+                total_size += stats.st_size
+
+    if total_size <= max_size:
+        return total_size
+
+    for _, size, file_path in sorted(entries):
+        with suppress(FileNotFoundError):
+            unlink(file_path)
+
+        total_size -= size
+
+        if total_size <= max_size:
+            break
+
+    return total_size
+
+
+def remove_generations(directory: str, current: str):
+    with suppress(FileNotFoundError):
+        for entry in scandir(directory):
+            if entry.is_dir() and entry.path != current:
+                rmtree(entry.path, ignore_errors=True)
+
+
+class DiskCache:
+    """
+    Per-node cache of rendered responses, keyed by ``Request.path``, in
+    front of the cache blobs. The directory is shared by the workers on
+    the node: files are written to a temporary path and moved into place,
+    so that they are never read incomplete.
+
+    Entries are either the body of the response, or a marker recording
+    that the cache blob exists. Entries are evicted on a least-recently-
+    used basis (by modification time, which is updated on each hit) once
+    the directory exceeds ``max_size`` bytes.
+
+    The size of the directory is tracked as entries are written by the
+    worker, and the directory is only scanned - to account for the entries
+    of other workers, and to evict entries - once the estimate exceeds
+    ``max_size``, or once an eighth of ``max_size`` has been written since
+    the last scan. File I/O runs outside the event loop.
+
+    Entries are stored per release (see ``Settings.latest_published_timestamp``),
+    and those of earlier releases are removed when a new one is published.
+    The cache is disabled until the latest release is known.
+    """
+    def __init__(self, directory: str = Settings.disk_cache_dir,
+                 max_size: int = Settings.disk_cache_max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self._scanned_dir: Union[str, None] = None
+        self._size = 0
+        self._written = 0
+        self._scanning = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and release_watcher.latest is not None
+
+    def _generation_dir(self) -> str:
+        generation = blake2b(release_watcher.latest.encode(), digest_size=8).hexdigest()
+        return path.join(self.directory, generation)
+
+    def _entry_path(self, key: str) -> str:
+        filename = blake2b(key.encode(), digest_size=16).hexdigest()
+        return path.join(self._generation_dir(), filename)
+
+    def _touch(self, file_path: str) -> bool:
+        try:
+            utime(file_path)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def contains(self, key: str) -> bool:
+        # A single metadata update - cheap enough to run on the loop.
+        if not self.enabled:
+            return False
+
+        file_path = self._entry_path(key)
+        return self._touch(file_path) or self._touch(file_path + MARKER_SUFFIX)
+
+    async def get(self, key: str, max_size: Union[int, None] = None) -> Union[bytes, None]:
+        """
+        Returns the body of an entry - or ``None`` if there isn't
+        one, or if it is larger than ``max_size`` bytes.
+        """
+        if not self.enabled:
+            return None
+
+        file_path = self._entry_path(key)
+
+        try:
+            if max_size is not None and (await aio_os.stat(file_path)).st_size > max_size:
+                return None
+
+            async with aio_open(file_path, "rb") as fp:
+                data = await fp.read()
+        except FileNotFoundError:
+            return None
+
+        self._touch(file_path)
+
+        return data
+
+    @asynccontextmanager
+    async def writer(self, key: str) -> AsyncIterator[Union[DiskCacheWriter, None]]:
+        """
+        Writes the body of an entry - committed if the block
+        exits without an exception, and discarded otherwise.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        file_path = self._entry_path(key)
+
+        try:
+            await aio_os.makedirs(path.dirname(file_path), exist_ok=True)
+            writer = await DiskCacheWriter.open(file_path)
+        except OSError as err:
+            logger.warning(f"Disk cache is not writable: {err}")
+            yield None
+            return
+
+        try:
+            yield writer
+        except BaseException:
+            await writer.discard()
+            raise
+
+        try:
+            await writer.commit()
+        except OSError as err:
+            # E.g. the generation has been removed in the meantime.
+            logger.warning(f"Failed to store '{key}' in disk cache: {err}")
+            await writer.discard()
+            return
+
+        await self._added(writer.size)
+
+    async def put(self, key: str, data: bytes):
+        async with self.writer(key) as writer:
+            if writer is not None:
+                await writer.write(data)
+
+    async def mark(self, key: str):
+        """
+        Records that the cache blob for ``key`` exists, without its body.
+        """
+        if not self.enabled:
+            return
+
+        marker_path = self._entry_path(key) + MARKER_SUFFIX
+
+        try:
+            await aio_os.makedirs(path.dirname(marker_path), exist_ok=True)
+            async with aio_open(marker_path, "ab"):
+                pass
+        except OSError as err:
+            logger.warning(f"Disk cache is not writable: {err}")
+
+    async def _added(self, size: int):
+        directory = self._generation_dir()
+
+        if directory != self._scanned_dir:
+            # Not yet scanned in this generation.
+            self._scanned_dir = directory
+            self._size, self._written = 0, self.max_size
+
+        self._size += size
+        self._written += size
+
+        if self._scanning or (self._size <= self.max_size and self._written < self.max_size // 8):
+            return
+
+        self._scanning = True
+
+        try:
+            self._size = await get_running_loop().run_in_executor(
+                None, scan_and_evict, directory, self.max_size
+            )
+            self._written = 0
+        finally:
+            self._scanning = False
+
+    async def refresh(self, timestamp: str):
+        """
+        Removes the entries of earlier releases - to be called
+        when a new release is published.
+        """
+        if not self.directory:
+            return
+
+        await get_running_loop().run_in_executor(None, remove_generations, self.directory, self._generation_dir())
+
+
+disk_cache = DiskCache()
@@ -0,0 +1,121 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Hashable, Sequence, Any, Union
+from collections import Counter
+from logging import getLogger
+
+# 3rd party:
+from orjson import dumps, loads
+
+# Internal:
+from app.config import Settings
+from .lru import ExpiringLRU
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'FragmentCache',
+    'fragment_cache'
+]
+
+
+logger = getLogger("app")
+
+EMPTY_FRAGMENT = b"[]"
+
+
+def pack_fragment(records: Sequence[Sequence[Any]]) -> bytes:
+    """
+    Serialises the ``(areaType, areaCode, areaName, date, metric, value)``
+    records of an area as JSON - in columns, with the area stored once
+    and the metrics as codes.
+    """
+    if not records:
+        return EMPTY_FRAGMENT
+
+    area_type, area_code, area_name, *_ = records[0]
+    metrics = dict()
+
+    rows = [
+        (date, metrics.setdefault(metric, len(metrics)), value)
+        for _, _, _, date, metric, value in records
+    ]
+
+    return dumps([area_type, area_code, area_name, list(metrics), rows])
+
+
+def unpack_fragment(data: bytes) -> list[tuple]:
+    fragment = loads(data)
+
+    if not fragment:
+        return list()
+
+    area_type, area_code, area_name, metrics, rows = fragment
+
+    return [
+        (area_type, area_code, area_name, date, metrics[metric_code], value)
+        for date, metric_code, value in rows
+    ]
+
+
+class FragmentCache:
+    """
+    Per-worker LRU cache of the DB records of individual areas, keyed
+    by the query (incl. release, area type and metrics) and the area ID,
+    so that downloads which include the same areas - e.g. a "complete"
+    download and a single area, or the same download in another format -
+    share their queries.
+
+    Records are held in a compact, serialised form (see ``pack_fragment``),
+    and the cache is bounded by their total size in bytes. Entries expire
+    ``ttl`` seconds after they are stored, and the cache is cleared when
+    a new release is published.
+    """
+    def __init__(self, max_size: int = Settings.fragment_cache_max_size,
+                 ttl: float = Settings.fragment_cache_ttl):
+        self.counters = Counter(hits=0, misses=0)
+        self._entries: ExpiringLRU[Hashable, bytes] = ExpiringLRU(max_size, ttl, sizeof=len)
+
+    @property
+    def enabled(self) -> bool:
+        return self._entries.max_size > 0
+
+    @property
+    def size(self) -> int:
+        return self._entries.size
+
+    def get(self, key: Hashable) -> Union[list[tuple], None]:
+        data = self._entries.get(key)
+
+        if data is None:
+            self.counters["misses"] += 1
+            return None
+
+        self.counters["hits"] += 1
+
+        return unpack_fragment(data)
+
+    def put(self, key: Hashable, records: Sequence[Sequence[Any]]):
+        if not self.enabled:
+            return
+
+        data = pack_fragment(records)
+
+        # Fragments larger than an eighth of the cache
+        # would evict too much of it.
+        if len(data) > self._entries.max_size // 8:
+            return
+
+        self._entries.put(key, data)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def refresh(self, timestamp: str):
+        self.clear()
+
+
+fragment_cache = FragmentCache()
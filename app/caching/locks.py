@@ -0,0 +1,240 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Union
+from abc import ABC, abstractmethod
+from hashlib import blake2b
+from logging import getLogger
+
+# 3rd party:
+from asyncpg import connect, Connection as BaseConnection
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+# Internal:
+from app.config import Settings
+from app.database import Connection
+from app.database.postgres import CONN_STR
+from app.storage import AsyncStorageClient, AsyncLockBlob
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'LockNotAcquired',
+    'BuildLock',
+    'LockBackend',
+    'BlobLeaseBackend',
+    'AdvisoryLockBackend',
+    'get_lock_backend',
+    'lock_backend'
+]
+
+
+logger = getLogger("app")
+
+TRY_LOCK = "SELECT pg_try_advisory_lock($1)"
+
+# Advisory locks on a 64-bit key are listed with the high and the low
+# 32 bits of the key as `classid` and `objid`, and `objsubid` set to 1.
+IS_LOCKED = """\
+SELECT EXISTS (
+    SELECT 1
+    FROM pg_locks
+    WHERE locktype = 'advisory'
+      AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND classid = $1::BIGINT::OID
+      AND objid = $2::BIGINT::OID
+      AND objsubid = 1
+      AND granted
+)"""
+
+LEASE_CONTAINER = "apiv2cache"
+LEASE_PREFIX = "leases"
+
+
+class LockNotAcquired(Exception):
+    """
+    The lock is held by another build.
+    """
+
+
+class BuildLock(ABC):
+    """
+    Exclusive lock on the build of a cache blob.
+    """
+    @abstractmethod
+    async def acquire(self):
+        """
+        Raises ``LockNotAcquired`` if the lock is held by another build.
+        """
+        ...
+
+    @abstractmethod
+    async def release(self):
+        ...
+
+
+class LockBackend(ABC):
+    @abstractmethod
+    def lock(self, key: str) -> BuildLock:
+        ...
+
+    @abstractmethod
+    async def is_locked(self, key: str) -> bool:
+        ...
+
+
+def lease_client(key: str) -> AsyncStorageClient:
+    return AsyncStorageClient(
+        container=LEASE_CONTAINER,
+        path=f"{LEASE_PREFIX}/{key}",
+        compressed=False
+    )
+
+
+class BlobLease(BuildLock):
+    def __init__(self, key: str, duration: int):
+        self._client = lease_client(key)
+        self._duration = duration
+        self._lease: Union[AsyncLockBlob, None] = None
+
+    async def _acquire(self) -> AsyncLockBlob:
+        # Lease blobs only exist whilst the lock is held (or
+        # being acquired) - see `release`.
+        try:
+            await self._client.upload(b"", overwrite=False)
+        except ResourceExistsError:
+            pass
+
+        lease = self._client.lock_file(self._duration)
+
+        try:
+            await lease.acquire()
+        except ResourceNotFoundError:
+            # Deleted by the previous holder in the meantime.
+            raise LockNotAcquired()
+
+        return lease
+
+    async def acquire(self):
+        await self._client.__aenter__()
+
+        try:
+            self._lease = await self._acquire()
+        except ResourceExistsError:
+            await self._client.__aexit__(None, None, None)
+            raise LockNotAcquired()
+        except BaseException:
+            await self._client.__aexit__(None, None, None)
+            raise
+
+    async def release(self):
+        if self._lease is None:
+            return
+
+        lease, self._lease = self._lease, None
+
+        try:
+            await lease.stop_renewal()
+
+            # Deleting the blob ends the lease.
+            try:
+                await self._client.delete()
+            except Exception as err:
+                logger.warning(f"Failed to remove the lease blob '{self._client.path}': {err}")
+                await lease.release()
+        finally:
+            await self._client.__aexit__(None, None, None)
+
+
+class BlobLeaseBackend(LockBackend):
+    """
+    Leases on a lease blob of each key - kept apart from the cache
+    blob, which is only published once complete. Leases are renewed
+    in the background whilst they are held (see ``AsyncLockBlob``),
+    and lease blobs are deleted when the lock is released.
+    """
+    def __init__(self, duration: int = 15):
+        self.duration = duration
+
+    def lock(self, key: str) -> BuildLock:
+        return BlobLease(key, self.duration)
+
+    async def is_locked(self, key: str) -> bool:
+        async with lease_client(key) as blob_client:
+            state = await blob_client.cache_state()
+
+        return state.leased
+
+
+def advisory_key(key: str) -> int:
+    # Advisory locks are identified by a signed 64-bit integer.
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def lock_id(lock_key: int) -> tuple[int, int]:
+    # The (classid, objid) of the lock in `pg_locks`.
+    unsigned = lock_key & 0xFFFFFFFFFFFFFFFF
+    return unsigned >> 32, unsigned & 0xFFFFFFFF
+
+
+class AdvisoryLock(BuildLock):
+    def __init__(self, key: str, conn_str: str = CONN_STR):
+        self._key = advisory_key(key)
+        self._conn_str = conn_str
+        self._conn: Union[BaseConnection, None] = None
+
+    async def acquire(self):
+        conn = await connect(self._conn_str)
+
+        try:
+            acquired = await conn.fetchval(TRY_LOCK, self._key)
+        except BaseException:
+            await conn.close()
+            raise
+
+        if not acquired:
+            await conn.close()
+            raise LockNotAcquired()
+
+        self._conn = conn
+
+    async def release(self):
+        if self._conn is None:
+            return
+
+        # The lock is released with the session.
+        conn, self._conn = self._conn, None
+        await conn.close()
+
+
+class AdvisoryLockBackend(LockBackend):
+    """
+    Postgres session-level advisory locks on a hash of the key.
+
+    Each lock is held on a dedicated connection - outside the pool, so
+    that builds never compete with their own queries for connections -
+    which is closed on release. The lock is released by the DB if the
+    session dies, so builders that crash never leave a stale lock.
+    Requires session pooling: locks do not persist between transactions
+    through a transaction-level pooler.
+
+    Locks are looked up in ``pg_locks``, without attempting to take them.
+    """
+    def lock(self, key: str) -> BuildLock:
+        return AdvisoryLock(key)
+
+    async def is_locked(self, key: str) -> bool:
+        async with Connection() as conn:
+            return await conn.fetchval(IS_LOCKED, *lock_id(advisory_key(key)))
+
+
+def get_lock_backend(name: str = Settings.cache_lock_backend) -> LockBackend:
+    if name == "advisory":
+        return AdvisoryLockBackend()
+
+    return BlobLeaseBackend()
+
+
+lock_backend = get_lock_backend()
@@ -0,0 +1,87 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Callable, Generic, Hashable, TypeVar, Union
+from collections import OrderedDict
+from time import monotonic
+
+# 3rd party:
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'ExpiringLRU'
+]
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def count_entry(value) -> int:
+    return 1
+
+
+class ExpiringLRU(Generic[K, V]):
+    """
+    Least-recently-used mapping whose entries expire ``ttl`` seconds
+    after they are stored.
+
+    The mapping is bounded by the total size of its entries, as measured
+    by ``sizeof`` - one per entry by default. The least recently used
+    entries are evicted once the total exceeds ``max_size``.
+    """
+    def __init__(self, max_size: int, ttl: float, sizeof: Callable[[V], int] = count_entry):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries: OrderedDict[K, tuple[float, V, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Union[V, None]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires_at, value, _ = entry
+
+        if monotonic() >= expires_at:
+            self.remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+
+        return value
+
+    def put(self, key: K, value: V, ttl: Union[float, None] = None):
+        """
+        Stores ``value`` - for ``ttl`` seconds where provided, instead
+        of the default TTL.
+        """
+        size = self.sizeof(value)
+
+        self.remove(key)
+        self._entries[key] = (monotonic() + (self.ttl if ttl is None else ttl), value, size)
+        self.size += size
+
+        while self.size > self.max_size:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def remove(self, key: K):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
@@ -0,0 +1,100 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Union
+from logging import getLogger
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+from .lru import ExpiringLRU
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'MemoryCache',
+    'BodyBuffer',
+    'memory_cache'
+]
+
+
+logger = getLogger("app")
+
+
+class BodyBuffer:
+    """
+    Collects the body of a response, unless it exceeds ``limit``
+    bytes - in which case the data are dropped.
+    """
+    def __init__(self, limit: int = Settings.memory_cache_max_item_size):
+        self.limit = limit
+        self.size = 0
+        self._parts: list[bytes] = list()
+
+    @property
+    def exceeded(self) -> bool:
+        return self.size > self.limit
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+
+        if self.exceeded:
+            self._parts.clear()
+            return
+
+        self._parts.append(data)
+
+    def getvalue(self) -> Union[bytes, None]:
+        if self.exceeded:
+            return None
+
+        return b"".join(self._parts)
+
+
+class MemoryCache:
+    """
+    Per-worker LRU cache of small response bodies, keyed by
+    ``Request.path``, so they may be served without a redirect.
+
+    Bodies larger than ``max_item_size`` bytes are not cached, and the
+    least recently used entries are evicted once the total exceeds
+    ``max_size`` bytes. Entries expire ``ttl`` seconds after they are
+    stored - in line with the ``max-age`` of the responses - and are
+    cleared when a new release is published.
+    """
+    def __init__(self, max_size: int = Settings.memory_cache_max_size,
+                 max_item_size: int = Settings.memory_cache_max_item_size,
+                 ttl: float = Settings.memory_cache_ttl):
+        self.max_item_size = max_item_size
+        self._entries: ExpiringLRU[str, bytes] = ExpiringLRU(max_size, ttl, sizeof=len)
+
+    @property
+    def size(self) -> int:
+        return self._entries.size
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Union[bytes, None]:
+        return self._entries.get(key)
+
+    def put(self, key: str, content: Union[bytes, None]):
+        if content is None or len(content) > self.max_item_size or not self._entries.max_size:
+            return
+
+        self._entries.put(key, content)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def refresh(self, timestamp: str):
+        self.clear()
+
+
+memory_cache = MemoryCache()
@@ -0,0 +1,126 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from time import time
+from logging import getLogger
+
+# 3rd party:
+from azure.core.exceptions import ResourceNotFoundError
+
+# Internal:
+from app.config import Settings
+from app.storage import AsyncStorageClient
+from app.utils.releases import release_watcher
+from .lru import ExpiringLRU
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'NegativeCache',
+    'negative_cache'
+]
+
+
+logger = getLogger("app")
+
+MARKER_CONTAINER = "apiv2cache"
+MARKER_PREFIX = "negative"
+
+
+class NegativeCache:
+    """
+    Requests (keyed by ``Request.path``) known to produce no data, so
+    that they may be answered without querying the DB again.
+
+    Entries are held in memory by each worker for ``ttl`` seconds, and
+    are cleared when a new release is published. Where ``use_blobs`` is
+    set, entries are also shared with other workers and nodes as empty
+    marker blobs, whose "expires" tag holds the (Unix) time at which
+    they expire. Expired markers are deleted by the first worker to find
+    them. Markers are stored per release (see ``release_watcher``), so
+    that those of earlier releases are never read - they are left to the
+    lifecycle management rules of the storage account.
+
+    Checking ``key in cache`` only looks at the entries held in memory,
+    whereas ``contains`` also looks for a marker blob - and is therefore
+    only meant for requests that are not otherwise cached.
+    """
+    def __init__(self, ttl: float = Settings.negative_cache_ttl,
+                 max_entries: int = Settings.negative_cache_max_entries,
+                 use_blobs: bool = Settings.negative_cache_blobs):
+        self.ttl = ttl
+        self.use_blobs = use_blobs
+        self._entries: ExpiringLRU[str, bool] = ExpiringLRU(max_entries, ttl)
+
+    @property
+    def shared(self) -> bool:
+        return self.use_blobs and release_watcher.latest is not None
+
+    def _marker_client(self, key: str) -> AsyncStorageClient:
+        return AsyncStorageClient(
+            container=MARKER_CONTAINER,
+            path=f"{MARKER_PREFIX}/{release_watcher.latest}/{key}",
+            compressed=False
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.ttl) and self._entries.get(key) is not None
+
+    async def contains(self, key: str) -> bool:
+        if key in self:
+            return True
+
+        if not (self.ttl and self.shared):
+            return False
+
+        try:
+            async with self._marker_client(key) as blob_client:
+                tags = await blob_client.get_tags()
+
+                if tags and float(tags.get("expires", 0)) <= time():
+                    tags = None
+
+                    try:
+                        await blob_client.delete()
+                    except ResourceNotFoundError:
+                        # Deleted by another worker in the meantime.
+                        pass
+        except Exception as err:
+            logger.warning(f"Failed to check the negative cache for '{key}': {err}")
+            return False
+
+        if not tags:
+            return False
+
+        remaining = float(tags["expires"]) - time()
+
+        self._entries.put(key, True, ttl=min(remaining, self.ttl))
+
+        return True
+
+    async def add(self, key: str):
+        if not self.ttl:
+            return
+
+        self._entries.put(key, True)
+
+        if not self.shared:
+            return
+
+        try:
+            async with self._marker_client(key) as blob_client:
+                await blob_client.upload(b"")
+                await blob_client.set_tags({"empty": "1", "expires": f"{time() + self.ttl:.0f}"})
+        except Exception as err:
+            logger.warning(f"Failed to store the negative cache marker for '{key}': {err}")
+
+    def clear(self):
+        self._entries.clear()
+
+    async def refresh(self, timestamp: str):
+        self.clear()
+
+
+negative_cache = NegativeCache()
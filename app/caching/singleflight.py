@@ -0,0 +1,70 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Callable, Awaitable, TypeVar
+from asyncio import Task, shield, get_running_loop
+from collections import Counter
+from logging import getLogger
+
+# 3rd party:
+from orjson import dumps
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'SingleFlight',
+    'single_flight'
+]
+
+
+logger = getLogger("app")
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Per-worker registry of in-flight operations, keyed by e.g.
+    ``Request.path``.
+
+    The first call for a key starts the operation. Calls made for the
+    same key whilst it is running attach to it and receive the same
+    result - or exception. The operation runs as a task of its own, so
+    it isn't cancelled if the request that started it is.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.counters = Counter(started=0, coalesced=0)
+        self._flights: dict[str, Task] = dict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    async def run(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+
+        if flight is None:
+            self.counters["started"] += 1
+            flight = self._flights[key] = get_running_loop().create_task(func())
+            flight.add_done_callback(lambda task: self._done(key, task))
+        else:
+            self.counters["coalesced"] += 1
+            logger.info(dumps({self.name: {"key": key, **self.counters}}).decode())
+
+        return await shield(flight)
+
+    def _done(self, key: str, task: Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+        # Marks the exception as retrieved, in case
+        # every caller has been cancelled.
+        if not task.cancelled():
+            task.exception()
+
+
+single_flight = SingleFlight("cacheBuilds")
@@ -0,0 +1,239 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Iterator, Union
+from asyncio import Event, wait_for, get_running_loop, TimeoutError as AsyncTimeoutError
+from contextlib import contextmanager, suppress
+from socket import socket, AF_UNIX, SOCK_DGRAM
+from os import makedirs, scandir, unlink, getpid, path
+from socket import gethostname
+from logging import getLogger
+
+# 3rd party:
+from orjson import dumps, loads
+
+# Internal:
+from app.config import Settings
+from .channel import NotifyChannel
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'BuildWaiters',
+    'BuildWatcher',
+    'build_waiters',
+    'backoff'
+]
+
+
+logger = getLogger("app")
+
+MAX_MESSAGE_SIZE = 4096  # bytes
+SOCKET_SUFFIX = ".sock"
+
+
+def backoff(initial: float = Settings.cache_poll_initial,
+            maximum: float = Settings.cache_poll_max) -> Iterator[float]:
+    """
+    Exponentially increasing delays, from ``initial`` to ``maximum``.
+    """
+    delay = initial
+
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+
+class _PathState:
+    def __init__(self):
+        self.event = Event()
+        self.generation = 0
+        self.watchers = 0
+
+
+class BuildWatcher:
+    def __init__(self, state: _PathState):
+        self._state = state
+        self._seen = state.generation
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Waits until the build is notified as finished, or for
+        ``timeout`` seconds. Returns ``True`` if notified.
+
+        Notifications received since the last call - e.g. whilst the
+        blob was being checked - are not missed.
+        """
+        state = self._state
+
+        if state.generation == self._seen:
+            with suppress(AsyncTimeoutError):
+                await wait_for(state.event.wait(), timeout=timeout)
+
+        notified = state.generation != self._seen
+        self._seen = state.generation
+
+        return notified
+
+
+class BuildWaiters:
+    """
+    Wakes requests waiting for a cache blob (keyed by ``Request.path``)
+    as soon as its build is finished.
+
+    Waiters in the same worker are woken through an ``asyncio.Event``.
+    Other workers on the same node are notified through Unix datagram
+    sockets - one per worker - in ``Settings.cache_notify_dir``. Workers
+    on other nodes are notified through the Postgres channel set in
+    ``Settings.cache_notify_channel``, on which each worker listens.
+
+    Notifications may still be lost (e.g. whilst the listening connection
+    is re-established), so waiters must also re-check the blob
+    periodically (see ``backoff``).
+    """
+    def __init__(self, directory: str = Settings.cache_notify_dir,
+                 channel: str = Settings.cache_notify_channel):
+        self.directory = directory
+        self.node = gethostname()
+        self._paths: dict[str, _PathState] = dict()
+        self._socket: Union[socket, None] = None
+        self._address: Union[str, None] = None
+        self._channel: Union[NotifyChannel, None] = None
+
+        if channel:
+            self._channel = NotifyChannel(channel, self._receive_notification)
+
+    @property
+    def listening(self) -> bool:
+        return self._socket is not None
+
+    def start(self):
+        if self._channel is not None:
+            self._channel.start()
+
+        if not self.directory or self.listening:
+            return
+
+        address = path.join(self.directory, f"{getpid()}{SOCKET_SUFFIX}")
+
+        try:
+            makedirs(self.directory, exist_ok=True)
+
+            # Left behind by an earlier process with the same PID.
+            with suppress(FileNotFoundError):
+                unlink(address)
+
+            sock = socket(AF_UNIX, SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(address)
+        except OSError as err:
+            logger.warning(f"Build notifications across workers are not available: {err}")
+            return
+
+        get_running_loop().add_reader(sock.fileno(), self._receive)
+
+        self._socket, self._address = sock, address
+
+    async def stop(self):
+        if self._channel is not None:
+            await self._channel.stop()
+
+        if not self.listening:
+            return
+
+        sock, self._socket = self._socket, None
+
+        get_running_loop().remove_reader(sock.fileno())
+        sock.close()
+
+        with suppress(FileNotFoundError):
+            unlink(self._address)
+
+    @contextmanager
+    def watch(self, request_path: str) -> Iterator[BuildWatcher]:
+        state = self._paths.get(request_path)
+
+        if state is None:
+            state = self._paths[request_path] = _PathState()
+
+        state.watchers += 1
+
+        try:
+            yield BuildWatcher(state)
+        finally:
+            state.watchers -= 1
+
+            if not state.watchers:
+                del self._paths[request_path]
+
+    async def notify(self, request_path: str):
+        """
+        Notifies the waiters in all workers - on all nodes - that the
+        build of ``request_path`` is finished, successfully or not.
+        """
+        self._wake(request_path)
+        self._broadcast(request_path)
+
+        if self._channel is None:
+            return
+
+        try:
+            await self._channel.publish(dumps({"node": self.node, "path": request_path}).decode())
+        except Exception as err:
+            logger.warning(f"Failed to notify other nodes of a finished build: {err}")
+
+    def _receive_notification(self, payload: str):
+        message = loads(payload)
+
+        # Workers on this node have been notified through the sockets.
+        if message["node"] == self.node and self.listening:
+            return
+
+        self._wake(message["path"])
+
+    def _wake(self, request_path: str):
+        state = self._paths.get(request_path)
+
+        if state is None:
+            return
+
+        state.generation += 1
+        state.event.set()
+        state.event = Event()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._socket.recv(MAX_MESSAGE_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+
+            self._wake(message.decode())
+
+    def _broadcast(self, request_path: str):
+        if not self.listening:
+            return
+
+        message = request_path.encode()
+
+        for entry in scandir(self.directory):
+            if entry.path == self._address or not entry.name.endswith(SOCKET_SUFFIX):
+                continue
+
+            try:
+                self._socket.sendto(message, entry.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker no longer exists.
+                with suppress(OSError):
+                    unlink(entry.path)
+            except BlockingIOError:
+                # The worker is busy - its waiters will
+                # re-check the blob after their timeout.
+                continue
+            except OSError as err:
+                logger.warning(f"Failed to notify '{entry.name}' of a finished build: {err}")
+
+
+build_waiters = BuildWaiters()
@@ -32,4 +32,103 @@ class Settings:
         "container": "pipeline",
         "path": "info/latest_published"
     }
+    release_poll_interval = float(getenv("RELEASE_POLL_INTERVAL", "60"))  # seconds
+
+    # Database connection pool - created once per worker.
+    db_pool_min_size = int(getenv("DB_POOL_MIN_SIZE", "2"))
+    db_pool_max_size = int(getenv("DB_POOL_MAX_SIZE", "10"))
+    db_pool_max_inactive_lifetime = float(getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+    db_pool_timeout = float(getenv("DB_POOL_TIMEOUT", "60"))
+
+    # Prepared statements - must be set to "unprepared" when the DB is
+    # accessed through a transaction-level pooler (e.g. PgBouncer), as
+    # named statements do not persist between transactions.
+    db_statement_mode = getenv("DB_STATEMENT_MODE", "prepared")
+    db_statement_cache_size = int(getenv("DB_STATEMENT_CACHE_SIZE", "64"))
+
+    # Number of chunk queries run in parallel (over pooled connections)
+    # when building a response, and whether they should all read from
+    # the same exported snapshot of the DB.
+    db_fetch_concurrency = int(getenv("DB_FETCH_CONCURRENCY", "4"))
+    db_shared_snapshot = getenv("DB_SHARED_SNAPSHOT", "1") == "1"
+
+    # Max number of fetched chunks queued for formatting - caps the
+    # memory used by a build whilst the next chunk is being fetched.
+    build_queue_depth = int(getenv("BUILD_QUEUE_DEPTH", "2"))
+
+    # Formatting of generic chunks - "inline" (on the event loop) or
+    # "process" (in a pool of processes owned by each worker). Chunks
+    # with fewer records than the threshold are always formatted inline.
+    format_executor = getenv("FORMAT_EXECUTOR", "inline")
+    format_pool_size = int(getenv("FORMAT_POOL_SIZE", "2"))
+    format_inline_threshold = int(getenv("FORMAT_INLINE_THRESHOLD", "5000"))  # records
+
+    # Waiting for a cache blob that is being built by another request.
+    # Waiters are notified when a build is finished - through sockets in
+    # the directory for workers on the same node, and through a Postgres
+    # channel for other nodes - and otherwise re-check the blob with an
+    # exponential backoff. Set the directory or the channel to an empty
+    # string to disable the respective notifications.
+    cache_wait_timeout = float(getenv("CACHE_WAIT_TIMEOUT", "290"))  # seconds
+    cache_poll_initial = float(getenv("CACHE_POLL_INITIAL", "0.25"))  # seconds
+    cache_poll_max = float(getenv("CACHE_POLL_MAX", "10"))  # seconds
+    cache_notify_dir = getenv("CACHE_NOTIFY_DIR", "/tmp/apiv2-cache-notify")
+    cache_notify_channel = getenv("CACHE_NOTIFY_CHANNEL", "apiv2_cache_ready")
+
+    # Upload of cache blobs - "staged" (blocks are uploaded whilst the
+    # response is being built) or "tempfile" (the response is written to
+    # a temporary file and uploaded once complete).
+    cache_upload_mode = getenv("CACHE_UPLOAD_MODE", "staged")
+    cache_block_size = int(getenv("CACHE_BLOCK_SIZE", str(4 * 1024 * 1024)))  # bytes
+    cache_upload_concurrency = int(getenv("CACHE_UPLOAD_CONCURRENCY", "4"))
+
+    # Exclusive lock on the build of a cache blob - "lease" (a lease on a
+    # lease blob of the key) or "advisory" (a Postgres advisory lock, which
+    # requires session pooling and holds a dedicated connection - outside
+    # the pool - during the build).
+    cache_lock_backend = getenv("CACHE_LOCK_BACKEND", "lease")
+
+    # Streams the response to the request that triggers a build, whilst
+    # it is being written to the cache - instead of redirecting to the
+    # cache blob once the build is finished.
+    cache_tee = getenv("CACHE_TEE", "0") == "1"
+    # Bytes held for a streamed client that falls behind the build - the
+    # client is detached beyond it, and the rest of the response is then
+    # streamed from the cache blob once it has been published.
+    cache_tee_max_buffer = int(getenv("CACHE_TEE_MAX_BUFFER", str(8 * 1024 ** 2)))
+
+    # Per-node disk cache of responses, in front of the cache blobs -
+    # shared by all workers on the node. Set the directory to an empty
+    # string to disable.
+    disk_cache_dir = getenv("DISK_CACHE_DIR", "/tmp/apiv2-cache")
+    disk_cache_max_size = int(getenv("DISK_CACHE_MAX_SIZE", str(1024 * 1024 * 1024)))  # bytes
+
+    # Per-worker memory cache of small responses, which are served
+    # without a redirect. Entries expire in line with the "max-age"
+    # of the responses. Set the size to 0 to disable.
+    memory_cache_max_size = int(getenv("MEMORY_CACHE_MAX_SIZE", str(64 * 1024 * 1024)))  # bytes
+    memory_cache_max_item_size = int(getenv("MEMORY_CACHE_MAX_ITEM_SIZE", str(256 * 1024)))  # bytes
+    memory_cache_ttl = float(getenv("MEMORY_CACHE_TTL", "90"))  # seconds
+
+    # Requests known to produce no data are answered with a 204 for the
+    # TTL, without querying the DB. Entries are held by each worker, and
+    # optionally shared as marker blobs. Set the TTL to 0 to disable.
+    negative_cache_ttl = float(getenv("NEGATIVE_CACHE_TTL", "60"))  # seconds
+    negative_cache_max_entries = int(getenv("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))
+    negative_cache_blobs = getenv("NEGATIVE_CACHE_BLOBS", "0") == "1"
+
+    # Per-worker cache of the DB records of individual areas, shared by
+    # the downloads that include them. Bounded by the size of the records
+    # once serialised - disabled by default (e.g. 32 MiB to enable).
+    fragment_cache_max_size = int(getenv("FRAGMENT_CACHE_MAX_SIZE", "0"))  # bytes
+    fragment_cache_ttl = float(getenv("FRAGMENT_CACHE_TTL", "300"))  # seconds
+
+    # Pre-warming of popular downloads when a new release is published -
+    # a JSON list of e.g. {"areaType": [...], "metric": [[...], ...], "format": [...]}
+    # expanded into all their combinations. One worker per node (elected
+    # through the lock file) builds them.
+    prewarm_targets = getenv("PREWARM_TARGETS", "[]")
+    prewarm_concurrency = int(getenv("PREWARM_CONCURRENCY", "1"))
+    prewarm_interval = float(getenv("PREWARM_INTERVAL", "1"))  # seconds
+    prewarm_lock_file = getenv("PREWARM_LOCK_FILE", "/tmp/apiv2-prewarm.lock")
 
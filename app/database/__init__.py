@@ -17,6 +17,7 @@ Contributors:  Pouria Hadjibagheri
 
 # Internal:
 from .postgres import *
+from .statements import *
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Header
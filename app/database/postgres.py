@@ -12,17 +12,22 @@ Contributors:  Pouria Hadjibagheri
 # Imports
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
-from typing import Any
+from typing import Any, Union
 from logging import getLogger
 from os import getenv
+from asyncio import Lock
 
 # 3rd party:
-from asyncpg import connect, Connection as BaseConnection
+from asyncpg import create_pool as create_asyncpg_pool, Connection as BaseConnection
+from asyncpg.pool import Pool
 from asyncpg.transaction import Transaction as BaseTransaction
+from asyncpg.exceptions import InvalidCachedStatementError
 from orjson import loads, dumps
 
 # Internal:
 from app.middleware.tracers.utils import trace_async_method_operation, trace_method_operation
+from app.config import Settings
+from .statements import PooledConnection
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Header
@@ -33,7 +38,9 @@ __version__ = "0.0.1"
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
-    "Connection"
+    "Connection",
+    "create_pool",
+    "close_pool"
 ]
 
 
@@ -42,6 +49,60 @@ DB_NAME = "database"
 
 logger = getLogger("asyncpg")
 
+# Connection pool - one per worker process. Created by the
+# startup hook of the app, or lazily on first use otherwise.
+_pool: Union[Pool, None] = None
+_pool_lock: Union[Lock, None] = None
+
+
+async def init_connection(conn: BaseConnection):
+    """
+    Initialises new connections in the pool. Runs once per
+    physical connection, not every time it is acquired.
+    """
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=dumps,
+        decoder=loads,
+        schema='pg_catalog'
+    )
+
+
+async def create_pool(conn_str=CONN_STR) -> Pool:
+    global _pool, _pool_lock
+
+    if _pool is not None:
+        return _pool
+
+    # The lock must be bound to the running event loop,
+    # which does not exist at import time.
+    if _pool_lock is None:
+        _pool_lock = Lock()
+
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await create_asyncpg_pool(
+                conn_str,
+                min_size=Settings.db_pool_min_size,
+                max_size=Settings.db_pool_max_size,
+                max_inactive_connection_lifetime=Settings.db_pool_max_inactive_lifetime,
+                statement_cache_size=0,
+                connection_class=PooledConnection,
+                init=init_connection
+            )
+
+    return _pool
+
+
+async def close_pool():
+    global _pool
+
+    if _pool is None:
+        return
+
+    pool, _pool = _pool, None
+    await pool.close()
+
 
 class Transaction(BaseTransaction):
     _name = "postgresql"
@@ -79,24 +140,34 @@ class Connection:
 
     def __init__(self, conn_str=CONN_STR):
         self.conn_str = conn_str
-        self._connection = connect(self.conn_str, statement_cache_size=0)
-
-    def __await__(self):
-        yield from self._connection.__await__()
-
-    async def __aenter__(self) -> BaseConnection:
-        self._conn = await self._connection
-        await self._conn.set_type_codec(
-            'jsonb',
-            encoder=dumps,
-            decoder=loads,
-            schema='pg_catalog'
-        )
+        self._pool = None
+        self._conn = None
+
+    @trace_async_method_operation(
+        name="_account_name",
+        dep_type="_name",
+        action="connection_acquire"
+    )
+    async def _acquire(self):
+        self._pool = await create_pool(self.conn_str)
+        return await self._pool.acquire(timeout=Settings.db_pool_timeout)
+
+    async def __aenter__(self) -> 'Connection':
+        self._conn = await self._acquire()
         # self._conn.add_log_listener(logger)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        return await self._conn.close()
+        conn, self._conn = self._conn, None
+        return await self._pool.release(conn)
+
+    @trace_async_method_operation(
+        name="_account_name",
+        dep_type="_name",
+        action="connection_execute"
+    )
+    async def execute(self, query, *args, **kwargs):
+        return await self._conn.execute(query, *args, **kwargs)
 
     @trace_async_method_operation(
         name="_account_name",
@@ -114,6 +185,34 @@ class Connection:
     async def fetch(self, query, *args, **kwargs):
         return await self._conn.fetch(query, *args, **kwargs)
 
+    @trace_async_method_operation(
+        name="_account_name",
+        dep_type="_name",
+        action="connection_fetch_prepared"
+    )
+    async def fetch_prepared(self, key, query, *args, **kwargs):
+        """
+        Fetches the results using a named prepared statement from
+        the registry of the connection, so that the query is only
+        planned once per connection.
+
+        Falls back to ``fetch`` when prepared statements are disabled
+        (see ``Settings.db_statement_mode``).
+        """
+        if Settings.db_statement_mode != "prepared":
+            return await self._conn.fetch(query, *args, **kwargs)
+
+        registry = self._conn.statement_registry
+
+        try:
+            statement = await registry.get(self._conn, key, query)
+            return await statement.fetch(*args, **kwargs)
+        except InvalidCachedStatementError:
+            # Schema has changed since the statement was prepared.
+            registry.discard(key)
+            statement = await registry.get(self._conn, key, query)
+            return await statement.fetch(*args, **kwargs)
+
     @trace_async_method_operation(
         name="_account_name",
         dep_type="_name",
@@ -129,7 +228,11 @@ class Connection:
     )
     def transaction(self, *, isolation=None, readonly=False, deferrable=False):
         self._conn._check_open()
-        return Transaction(self._conn, isolation=None, readonly=False, deferrable=False)
+        # Transactions keep their state on the connection, and must
+        # therefore be given the physical connection and not the proxy
+        # provided by the pool.
+        raw_conn = getattr(self._conn, "_con", self._conn)
+        return Transaction(raw_conn, isolation=isolation, readonly=readonly, deferrable=deferrable)
 
     @trace_method_operation(
         name="_account_name",
@@ -0,0 +1,101 @@
+#!/usr/bin python3
+
+"""
+Prepared statements
+-------------------
+
+Per-connection registry of named prepared statements. Statements are
+keyed by the template that produced the query, the DB partition and the
+filters - i.e. everything that alters the text of the query - and are
+evicted on a least-recently-used basis.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Hashable, Union
+from collections import OrderedDict, Counter
+from hashlib import blake2b
+from itertools import count
+from logging import getLogger
+
+# 3rd party:
+from asyncpg import Connection as BaseConnection
+from asyncpg.prepared_stmt import PreparedStatement
+from orjson import dumps
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    "StatementRegistry",
+    "PooledConnection",
+    "statement_counters"
+]
+
+
+logger = getLogger("app")
+
+# Per-worker hit / miss / eviction counts across all connections.
+statement_counters = Counter(hits=0, misses=0, evictions=0)
+
+
+class StatementRegistry:
+    def __init__(self, max_size: int = Settings.db_statement_cache_size):
+        self.max_size = max_size
+        self._statements: OrderedDict[Hashable, PreparedStatement] = OrderedDict()
+        self._sequence = count()
+
+    def _statement_name(self, key: Hashable) -> str:
+        # Names must be unique for the lifetime of the connection: evicted
+        # statements are only closed on the server when asyncpg garbage
+        # collects them, which may happen after the same key is re-prepared.
+        digest = blake2b(repr(key).encode(), digest_size=6).hexdigest()
+        return f"apiv2_{digest}_{next(self._sequence)}"
+
+    async def get(self, conn: BaseConnection, key: Hashable, query: str) -> PreparedStatement:
+        statement = self._statements.get(key)
+
+        if statement is not None:
+            self._statements.move_to_end(key)
+            statement_counters["hits"] += 1
+            return statement
+
+        statement_counters["misses"] += 1
+
+        statement = await conn.prepare(query, name=self._statement_name(key))
+        self._statements[key] = statement
+
+        if len(self._statements) > self.max_size:
+            # Dropping the last reference closes the statement
+            # on the server - see `asyncpg.Connection._maybe_gc_stmt`.
+            self._statements.popitem(last=False)
+            statement_counters["evictions"] += 1
+
+        logger.info(dumps({"preparedStatements": statement_counters}).decode())
+
+        return statement
+
+    def discard(self, key: Hashable):
+        self._statements.pop(key, None)
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class PooledConnection(BaseConnection):
+    """
+    Connection class used by the pool. Holds the registry of
+    prepared statements for the physical connection, so that
+    the statements survive releasing / re-acquiring it.
+    """
+    _statement_registry: Union[StatementRegistry, None] = None
+
+    @property
+    def statement_registry(self) -> StatementRegistry:
+        if self._statement_registry is None:
+            self._statement_registry = StatementRegistry()
+
+        return self._statement_registry
@@ -0,0 +1,99 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Callable, Awaitable, AsyncIterator, AsyncGenerator
+
+# 3rd party:
+
+# Internal:
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'ResponseAssembler',
+    'assemble_into'
+]
+
+
+Writer = Callable[[bytes], Awaitable[None]]
+ChunkProducer = Callable[..., AsyncIterator[tuple[int, bytes]]]
+
+
+class ResponseAssembler:
+    """
+    Assembles a response from its chunks, in the order of their indices,
+    irrespective of the order in which they are produced.
+
+    Chunk indices must be consecutive, starting from 0 - including chunks
+    without any data, which are produced as empty bytes. Chunks produced
+    ahead of their turn are held until all preceding chunks have been
+    written, so bytes that have been passed to ``write`` are never
+    rewritten.
+
+    The ``prefix`` (e.g. the opening of a JSON body, or the CSV header)
+    is written first, and ``delimiter`` is only written between chunks
+    that contain data.
+    """
+    def __init__(self, write: Writer, prefix: bytes = b"", suffix: bytes = b"", delimiter: bytes = b""):
+        self._write = write
+        self._prefix = prefix
+        self._suffix = suffix
+        self._delimiter = delimiter
+        self._held: dict[int, bytes] = dict()
+        self._next_index = 0
+        self._started = False
+        self.has_data = False
+
+    @property
+    def n_held(self) -> int:
+        return len(self._held)
+
+    async def add(self, index: int, item: bytes):
+        if index < self._next_index or index in self._held:
+            raise ValueError(f"Chunk {index} has already been produced.")
+
+        if not self._started:
+            await self._write(self._prefix)
+            self._started = True
+
+        self._held[index] = item
+
+        while self._next_index in self._held:
+            item = self._held.pop(self._next_index)
+            self._next_index += 1
+
+            if not item:
+                continue
+
+            if self.has_data:
+                await self._write(self._delimiter)
+
+            await self._write(item)
+            self.has_data = True
+
+    async def finalise(self):
+        if self._held:
+            raise ValueError(f"Chunk {self._next_index} was never produced.")
+
+        if not self._started:
+            await self._write(self._prefix)
+            self._started = True
+
+        await self._write(self._suffix)
+
+
+def assemble_into(func: ChunkProducer, assembler: ResponseAssembler) -> ChunkProducer:
+    """
+    Wraps a chunk producer so that a copy of the response
+    is assembled by ``assembler`` as the chunks are produced.
+    """
+    async def produce(**kwargs) -> AsyncGenerator[tuple[int, bytes], None]:
+        async for index, item in func(**kwargs):
+            await assembler.add(index, item)
+            yield index, item
+
+        await assembler.finalise()
+
+    return produce
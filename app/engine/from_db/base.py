@@ -4,24 +4,34 @@
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
 from logging import getLogger
-from typing import AsyncGenerator, Union
+from typing import AsyncGenerator, Iterator, Union
 from http import HTTPStatus
 from functools import partial
-from asyncio import sleep
+from asyncio import get_running_loop, wait, FIRST_COMPLETED
 from tempfile import NamedTemporaryFile
+from time import perf_counter
 
 # 3rd party:
 from orjson import dumps
 
 # Internal:
+from app.config import Settings
 from app.exceptions import NotAvailable
 from app.utils.operations import Response, RedirectResponse, Request
 from app.utils.assets import RequestMethod
 from app.database import Connection
 from app.storage import AsyncStorageClient
-from .utils import format_response, cache_response
+from app.caching import (
+    build_waiters, backoff, single_flight, disk_cache, memory_cache, negative_cache, BodyBuffer,
+    BuildWatcher, lock_backend, LockNotAcquired
+)
+from .utils import format_response, cache_response, response_framing, BuildStatus, AlreadyCached
 from .nested import process_nested_data
-from .generic import process_generic_data
+from .executor import format_generic_chunk
+from .fetcher import shared_snapshot, fetch_fragments
+from .pipeline import StageTimings, prefetch
+from .tee import TeeStream
+from .assembly import ResponseAssembler, assemble_into
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -69,70 +79,264 @@ def log_response(query, arguments):
 
 
 async def process_get_request(*, request: Request, **kwargs) -> AsyncGenerator[bytes, bytes]:
-    if len(request.nested_metrics) > 0:
-        func = partial(process_nested_data, request=request)
-    else:
-        func = partial(process_generic_data, request=request)
+    is_nested = len(request.nested_metrics) > 0
 
-    # We use cursor movements instead of offset-limit. This is faster
-    # as the DB won't have to iterate to fine the offset location.
-    async with Connection() as conn:
+    # Chunks are fetched concurrently from the same snapshot
+    # of the DB, and are yielded in their original order.
+    async with Connection() as conn, shared_snapshot(conn) as snapshot:
         area_codes = await request.get_query_area_codes(conn)
 
-        header_generated = False
+        timings = StageTimings()
 
-        # Fetching data from the DB.
-        for index, codes in enumerate(area_codes):
+        # Fetching data from the DB - the next chunk is fetched
+        # whilst the current one is being formatted.
+        chunks = fetch_fragments(conn, request, area_codes, snapshot)
 
-            result = await conn.fetch(request.db_query, *request.db_args, codes)
+        # Every chunk is yielded - those without any data as empty
+        # bytes - so that the response may be assembled in order. The
+        # CSV header is not included: it is added on assembly.
+        async for index, result in prefetch(chunks, timings):
             if not len(result):
+                yield index, bytes()
                 continue
 
-            res = format_response(
-                func(result),
-                response_type=request.format,
-                request=request,
-                include_header=not header_generated
-            )
+            start = perf_counter()
+            if is_nested:
+                res = format_response(
+                    process_nested_data(result, request=request),
+                    response_type=request.format,
+                    request=request,
+                    include_header=False
+                )
+            else:
+                res = await format_generic_chunk(result, request, include_header=False)
+            timings.format += perf_counter() - start
 
             yield index, res
 
-            header_generated = True
+        logger.info(f"BUILD TIMINGS: {dumps({'path': request.path, **timings.as_dict()}).decode()}")
 
 
-async def from_cache_or_db(request: Request) -> Union[Response, RedirectResponse]:
-    max_wait_cycles = 29  # Max wait: 4 minutes and 50 seconds
-    wait_period = 10  # seconds
-    wait_counter = 1
+async def wait_for_build(request: Request, watcher: BuildWatcher, deadline: float,
+                         delays: Iterator[float]) -> bool:
+    """
+    Waits for the cache blob of the request to be built by another
+    request. Returns ``True`` if it must be built by this request.
+
+    Cache blobs are only published once complete, so each iteration
+    is driven by a single request for the state of the blob:
+
+    - exists: cached;
+    - missing and locked: being built - wait for it to finish;
+    - missing: to be built.
+    """
+    loop = get_running_loop()
 
     kws = {
         "container": "apiv2cache",
         "path": request.path,
     }
 
-    cache_results = True
-
     async with AsyncStorageClient(**kws) as blob_client:
-        while await blob_client.exists() and wait_counter <= max_wait_cycles:
-            props = await blob_client.client.get_blob_tags()
-
-            # Wait for the blob lease to be release until `max_wait_cycles`
-            # is reached or the blob is removed.
-            lock_status = await blob_client.is_locked()
-            if lock_status and props.get("in_progress", '1') == '1':
-                await sleep(wait_period)
-                wait_counter += 1
-                continue
-            elif not lock_status and props.get('done', "0") != "1" and props.get('in_progress', '1') == '1':
+        while loop.time() < deadline:
+            state = await blob_client.cache_state()
+
+            if state.exists and state.status == BuildStatus.done:
+                return False
+
+            if state.exists:
+                # Blobs created before their builds by older instances.
+                if state.leased:
+                    await watcher.wait(timeout=min(next(delays), max(deadline - loop.time(), 0)))
+                    continue
+
+                if (await blob_client.get_tags() or dict()).get("done") == "1":
+                    return False
+
                 await blob_client.delete()
-                cache_results = True
-                break
-            elif props.get('done', "0") == "1" and props.get('in_progress', '1') == '0':
-                cache_results = False
-                break
+                return True
+
+            if not await lock_backend.is_locked(request.path):
+                return True
+
+            await watcher.wait(timeout=min(next(delays), max(deadline - loop.time(), 0)))
+
+    return True
+
+
+async def build_cache(request: Request, tee: Union[TeeStream, None] = None):
+    func = process_get_request if tee is None else tee.wrap(process_get_request)
+
+    # Small responses are also kept in memory.
+    body = BodyBuffer()
+    func = assemble_into(func, ResponseAssembler(body.write, *response_framing(request)))
+
+    built = True
+
+    try:
+        if request.format == "xml":
+            # xml responses are served with their body whatever their
+            # size, so they're also copied to the disk cache - and only
+            # stored there once they've been cached in full.
+            async with disk_cache.writer(request.path) as disk_entry:
+                if disk_entry is not None:
+                    assembler = ResponseAssembler(disk_entry.write, *response_framing(request))
+                    func = assemble_into(func, assembler)
+
+                await cache_response(func, request=request)
+        else:
+            await cache_response(func, request=request)
+
+        content = body.getvalue()
+        memory_cache.put(request.path, content)
+
+        # Other bodies are only served from the disk cache if they're
+        # small (see `from_local_cache`) - larger ones are redirected.
+        if request.format != "xml":
+            if content is not None:
+                await disk_cache.put(request.path, content)
+            else:
+                await disk_cache.mark(request.path)
+    except (LockNotAcquired, AlreadyCached):
+        # Raised before the build has started - there is
+        # nothing to notify the waiters of.
+        built = False
+        raise
+    except NotAvailable:
+        await negative_cache.add(request.path)
+        raise
+    finally:
+        if built:
+            await build_waiters.notify(request.path)
+
+
+async def ensure_cached(request: Request, tee: Union[TeeStream, None] = None):
+    """
+    Waits for the cache blob of the request to be built by another
+    request, or builds it - whilst copying the response to ``tee``,
+    where provided.
+    """
+    loop = get_running_loop()
+    deadline = loop.time() + Settings.cache_wait_timeout
+    delays = backoff()
+
+    with build_waiters.watch(request.path) as watcher:
+        while True:
+            if not await wait_for_build(request, watcher, deadline, delays):
+                await disk_cache.mark(request.path)
+                return
+
+            try:
+                return await build_cache(request, tee)
+            except AlreadyCached:
+                # Published by another build just before the lock was taken.
+                await disk_cache.mark(request.path)
+                return
+            except LockNotAcquired:
+                # Another build has started in the meantime.
+                if loop.time() >= deadline:
+                    raise
+
+                await watcher.wait(timeout=min(next(delays), max(deadline - loop.time(), 0)))
+
+
+async def stream_or_wait(request: Request) -> Union[Response, None]:
+    """
+    Runs ``ensure_cached`` for a request that starts a build, and
+    streams the response to the client whilst it is being cached.
 
-    if cache_results:
-        await cache_response(process_get_request, request=request)
+    Returns ``None`` if the response is not built by this request,
+    once it is cached.
+    """
+    tee = TeeStream(request)
+    build = get_running_loop().create_task(
+        single_flight.run(request.path, partial(ensure_cached, request, tee))
+    )
+
+    # The build carries on irrespective of the client - its errors
+    # are also raised in the streamed body.
+    build.add_done_callback(lambda task: task.cancelled() or task.exception())
+    await wait({build, tee.ready}, return_when=FIRST_COMPLETED)
+
+    if not tee.ready.done():
+        # Raises the exception if the build has failed.
+        build.result()
+        return None
+
+    return Response(
+        content=tee.body(build),
+        status_code=HTTPStatus.OK.real,
+        content_type=request.format,
+        release_date=request.release,
+        request=request
+    )
+
+
+def cached_response(request: Request, content: bytes) -> Response:
+    return Response(
+        content=content,
+        status_code=HTTPStatus.OK.real,
+        content_type=request.format,
+        release_date=request.release,
+        request=request
+    )
+
+
+async def from_local_cache(request: Request) -> Union[Response, RedirectResponse, None]:
+    """
+    Serves the response from the memory or disk cache - small
+    responses and xml responses with their body, and others
+    through a redirect to the cache blob.
+    """
+    if (content := memory_cache.get(request.path)) is not None:
+        return cached_response(request, content)
+
+    if not disk_cache.contains(request.path):
+        return None
+
+    max_size = None if request.format == "xml" else memory_cache.max_item_size
+
+    # Entries may only be markers - in which case the
+    # xml body is downloaded from the cache blob.
+    if (content := await disk_cache.get(request.path, max_size=max_size)) is not None:
+        memory_cache.put(request.path, content)
+        return cached_response(request, content)
+
+    if request.format != "xml":
+        return RedirectResponse(request, "apiv2cache", request.path)
+
+    return None
+
+
+def is_cached_locally(request: Request) -> bool:
+    return request.path in memory_cache or disk_cache.contains(request.path)
+
+
+async def from_cache_or_db(request: Request) -> Union[Response, RedirectResponse]:
+    if (response := await from_local_cache(request)) is not None:
+        return response
+
+    # Markers shared by other workers and nodes are only
+    # looked up for requests that aren't cached locally.
+    if await negative_cache.contains(request.path):
+        raise NotAvailable()
+
+    # Identical requests in this worker share one build - only
+    # the request that starts it may have it streamed.
+    if Settings.cache_tee and request.path not in single_flight:
+        if (response := await stream_or_wait(request)) is not None:
+            return response
+    else:
+        await single_flight.run(request.path, partial(ensure_cached, request))
+
+    # Built by this worker.
+    if (content := memory_cache.get(request.path)) is not None:
+        return cached_response(request, content)
+
+    kws = {
+        "container": "apiv2cache",
+        "path": request.path,
+    }
 
     if request.format != "xml":
         return RedirectResponse(request, "apiv2cache", request.path)
@@ -141,26 +345,32 @@ async def from_cache_or_db(request: Request) -> Union[Response, RedirectResponse
         async with AsyncStorageClient(kws['container'], kws['path']) as cli:
             await cli.download_into(cache_file)
 
-        return Response(
-            content=cache_file.read(),
-            status_code=HTTPStatus.OK.real,
-            content_type=request.format,
-            release_date=request.release,
-            request=request
-        )
+        content = cache_file.read()
+
+    await disk_cache.put(request.path, content)
+    memory_cache.put(request.path, content)
+
+    return cached_response(request, content)
 
 
 async def get_data(*, request: Request) -> Union[Response, RedirectResponse]:
     content = None
 
+    if request.is_unknown_area or request.path in negative_cache:
+        raise NotAvailable()
+
     if request.method == RequestMethod.Get:
         content = await from_cache_or_db(request=request)
 
-    if request.method == RequestMethod.Head:
+    if request.method == RequestMethod.Head and not is_cached_locally(request):
+        if await negative_cache.contains(request.path):
+            raise NotAvailable()
+
         async with Connection() as conn:
             values = await conn.fetchval(request.db_query, *request.db_args)
 
         if values is None or not values:
+            await negative_cache.add(request.path)
             raise NotAvailable()
 
     return content
@@ -0,0 +1,105 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import NamedTuple, Sequence, Union
+from asyncio import get_running_loop
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from logging import getLogger
+
+# 3rd party:
+from asyncpg import Record
+
+# Internal:
+from app.config import Settings
+from app.utils.operations import Request
+from .pivot import RecordChunk, factorise_records, pivot_chunk
+from .generic import process_generic_data
+from .serialiser import serialise, serialise_frame
+from .utils import csv_columns
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'format_generic_chunk',
+    'shutdown_executor'
+]
+
+
+logger = getLogger("app")
+
+_executor: Union[ProcessPoolExecutor, None] = None
+
+
+class FormatSpec(NamedTuple):
+    area_type: str
+    response_type: str
+    csv_names: Union[list[str], None]
+    include_header: bool
+
+
+def format_chunk(chunk: RecordChunk, spec: FormatSpec) -> bytes:
+    # Runs in the worker processes.
+    frame = pivot_chunk(chunk, spec.area_type)
+    return serialise(frame, spec.response_type, spec.csv_names, spec.include_header)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    # Created lazily, so that each (gunicorn) worker
+    # owns its pool - even when the app is preloaded.
+    # Processes are started by a fork server rather than
+    # forked from the worker: its threads (e.g. the trace
+    # exporter) may hold locks that would never be released
+    # in the forked children.
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=Settings.format_pool_size,
+            mp_context=get_context("forkserver")
+        )
+
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+
+    if _executor is not None:
+        executor, _executor = _executor, None
+        executor.shutdown(wait=False)
+
+
+async def format_generic_chunk(results: Sequence[Record], request: Request, include_header: bool) -> bytes:
+    """
+    Pivots and serialises a chunk of generic query results.
+
+    When ``Settings.format_executor`` is set to ``"process"``, chunks
+    of at least ``Settings.format_inline_threshold`` records are sent
+    to the process pool in a compact form (see ``pivot.RecordChunk``),
+    so that the event loop isn't blocked whilst they are formatted.
+    """
+    if Settings.format_executor != "process" or len(results) < Settings.format_inline_threshold:
+        frame = process_generic_data(results, request)
+        return serialise_frame(frame, request.format, request, include_header)
+
+    spec = FormatSpec(
+        area_type=request.area_type,
+        response_type=request.format,
+        csv_names=csv_columns(request) if request.format == "csv" else None,
+        include_header=include_header
+    )
+
+    loop = get_running_loop()
+
+    try:
+        return await loop.run_in_executor(get_executor(), format_chunk, factorise_records(results), spec)
+    except BrokenProcessPool:
+        # A worker process has died - the pool cannot be
+        # reused and is replaced on the next request.
+        logger.warning("Format process pool is broken - replacing the pool.")
+        shutdown_executor()
+        raise
@@ -0,0 +1,260 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import AsyncGenerator, AsyncIterator, Iterable, Any, Union
+from asyncio import Semaphore, gather, get_running_loop
+from contextlib import asynccontextmanager
+from collections import defaultdict
+from logging import getLogger
+
+# 3rd party:
+from asyncpg import Record
+from orjson import dumps
+
+# Internal:
+from app.config import Settings
+from app.database import Connection
+from app.utils.operations import Request
+from app.utils.areas import area_index
+from app.caching import fragment_cache
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'shared_snapshot',
+    'fetch_chunks',
+    'fetch_fragments'
+]
+
+
+logger = getLogger("app")
+
+
+EXPORT_SNAPSHOT = "SELECT pg_export_snapshot();"
+
+# Snapshot IDs are generated by the DB and cannot be
+# passed as query parameters.
+IMPORT_SNAPSHOT = "SET TRANSACTION SNAPSHOT '{snapshot_id}';"
+
+_fetch_slots: Union[Semaphore, None] = None
+
+
+@asynccontextmanager
+async def shared_snapshot(conn: Connection) -> AsyncIterator[Union[str, None]]:
+    """
+    Exports a snapshot of the DB from ``conn`` so that concurrent chunk
+    queries - running on other connections - see the same data.
+
+    The snapshot is only valid whilst the context is open. Yields ``None``
+    when chunks are fetched sequentially or snapshots are disabled.
+    """
+    if Settings.db_fetch_concurrency < 2 or not Settings.db_shared_snapshot:
+        yield None
+        return
+
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        yield await conn.fetchval(EXPORT_SNAPSHOT)
+
+
+def fetch_slots() -> Semaphore:
+    """
+    Extra connections that may be taken from the pool - across all
+    builds of the worker - to fetch chunks in parallel. One connection
+    of the pool is left for the connections that builds start with.
+    """
+    global _fetch_slots
+
+    # The semaphore must be bound to the running event
+    # loop, which does not exist at import time.
+    if _fetch_slots is None:
+        _fetch_slots = Semaphore(max(Settings.db_pool_max_size - 1, 0))
+
+    return _fetch_slots
+
+
+async def fetch_chunks(conn: Connection, request: Request, area_codes: Iterable[Any],
+                       snapshot: Union[str, None] = None
+                       ) -> AsyncGenerator[tuple[int, list[Record]], None]:
+    """
+    Runs the DB query of the request for each chunk of ``area_codes`` and
+    yields ``(index, results)`` in the original order of the chunks.
+
+    Up to ``Settings.db_fetch_concurrency`` chunks are fetched in parallel:
+    one on ``conn``, and the others over extra connections from the pool -
+    where a fetch slot (see ``fetch_slots``) is free. Chunks are always
+    fetched on ``conn``, so builds never wait for extra connections and
+    carry on sequentially when there are none. The number of chunks that
+    are fetched but not yet consumed is bound by the same figure.
+    """
+    chunks = list(enumerate(area_codes))
+    n_workers = min(Settings.db_fetch_concurrency, len(chunks))
+
+    if n_workers < 2:
+        for index, codes in chunks:
+            result = await conn.fetch_prepared(
+                request.db_query_key,
+                request.db_query,
+                *request.db_args,
+                codes
+            )
+            yield index, result
+
+        return
+
+    loop = get_running_loop()
+    results = {index: loop.create_future() for index, _ in chunks}
+    pending = iter(chunks)
+    window = Semaphore(n_workers)
+    slots = fetch_slots()
+
+    def fail(err: BaseException):
+        # Fail the whole build - outstanding chunks may otherwise
+        # never be fetched and leave the consumer waiting.
+        for future in results.values():
+            if not future.done():
+                future.set_exception(err)
+
+    async def run_chunks(worker_conn: Connection):
+        try:
+            while True:
+                # Taking the slot before the chunk guarantees that
+                # chunks are always fetched in their original order.
+                await window.acquire()
+
+                if (item := next(pending, None)) is None:
+                    window.release()
+                    return
+
+                index, codes = item
+                result = await worker_conn.fetch_prepared(
+                    request.db_query_key,
+                    request.db_query,
+                    *request.db_args,
+                    codes
+                )
+                if not results[index].done():
+                    results[index].set_result(result)
+
+        except Exception as err:
+            fail(err)
+            raise err
+
+    async def extra_worker():
+        # Only connections that are available are used.
+        if slots.locked():
+            return
+
+        async with slots:
+            try:
+                worker_conn = await Connection().__aenter__()
+            except Exception as err:
+                logger.warning(f"Fetching chunks without an extra connection: {err}")
+                return
+
+            try:
+                if snapshot is None:
+                    return await run_chunks(worker_conn)
+
+                async with worker_conn.transaction(isolation="repeatable_read", readonly=True):
+                    await worker_conn.execute(IMPORT_SNAPSHOT.format(snapshot_id=snapshot))
+                    return await run_chunks(worker_conn)
+
+            except Exception as err:
+                fail(err)
+                raise err
+
+            finally:
+                await worker_conn.__aexit__(None, None, None)
+
+    workers = [
+        loop.create_task(run_chunks(conn)),
+        *(loop.create_task(extra_worker()) for _ in range(n_workers - 1))
+    ]
+
+    try:
+        for index, _ in chunks:
+            result = await results[index]
+            window.release()
+            yield index, result
+    finally:
+        for task in workers:
+            task.cancel()
+
+        await gather(*workers, return_exceptions=True)
+
+        for future in results.values():
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                # Marks the exception as retrieved.
+                future.exception()
+
+
+def chunk_area_ids(codes: Any) -> list[int]:
+    # Chunks are either a list of area ID rows, or a single row.
+    if isinstance(codes, list):
+        return [row[0] for row in codes]
+
+    return [codes[0]]
+
+
+async def fetch_fragments(conn: Connection, request: Request, area_codes: Iterable[Any],
+                          snapshot: Union[str, None] = None
+                          ) -> AsyncGenerator[tuple[int, list[Record]], None]:
+    """
+    Same as ``fetch_chunks`` - but the records of each area are taken
+    from the fragment cache where available, and only the areas that
+    are missing are queried. The records of the queried areas are then
+    added to the cache.
+
+    Only applies to generic (non-nested, non-MSOA) queries, whose records
+    are attributed to areas through the area index. The order of records
+    within a chunk may differ from the DB - they are sorted on formatting.
+    """
+    if not (fragment_cache.enabled and area_index.loaded and request.db_query_key[0] == "main_data"):
+        async for item in fetch_chunks(conn, request, area_codes, snapshot):
+            yield item
+        return
+
+    query_key = (*request.db_query_key, request.area_type, tuple(sorted(request.db_metrics)))
+
+    chunks = [
+        {area_id: fragment_cache.get((query_key, area_id)) for area_id in chunk_area_ids(codes)}
+        for codes in area_codes
+    ]
+    missing = [
+        [(area_id,) for area_id, records in fragments.items() if records is None]
+        for fragments in chunks
+    ]
+
+    n_fetched = sum(map(len, missing))
+    n_cached = sum(map(len, chunks)) - n_fetched
+    logger.info(f"FRAGMENT CACHE: {dumps({'path': request.path, 'cached': n_cached, 'fetched': n_fetched}).decode()}")
+
+    fetched = fetch_chunks(conn, request, [codes for codes in missing if codes], snapshot)
+
+    try:
+        for index, fragments in enumerate(chunks):
+            result = list()
+
+            if missing[index]:
+                _, result = await fetched.__anext__()
+                result = list(result)
+
+                by_code = defaultdict(list)
+                for record in result:
+                    by_code[record[1]].append(record)
+
+                for (area_id,) in missing[index]:
+                    if (area := area_index.get(area_id)) is not None:
+                        fragment_cache.put((query_key, area_id), by_code.get(area.code, list()))
+
+            for records in fragments.values():
+                if records is not None:
+                    result.extend(records)
+
+            yield index, result
+    finally:
+        await fetched.aclose()
@@ -6,14 +6,11 @@
 from typing import Iterable
 
 # 3rd party:
-from pandas import DataFrame
 from asyncpg import Record
 
 # Internal:
 from app.utils.operations import Request
-from app.utils.assets import MetricData
-from .utils import format_dtypes, format_data
-from .msoa import format_msoas
+from .pivot import ColumnarFrame, pivot_records
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -22,29 +19,5 @@ __all__ = [
 ]
 
 
-def process_generic_data(results: Iterable[Record], request: Request) -> DataFrame:
-    df = DataFrame(results, columns=[*MetricData.base_metrics, "metric", "value"])
-
-    response_metrics = df.metric.unique()
-    column_types = {
-        metric: MetricData.generic_dtypes[metric]
-        for metric in filter(response_metrics.__contains__, MetricData.generic_dtypes)
-    }
-
-    payload = (
-        df
-        .pivot_table(
-            values="value",
-            index=MetricData.base_metrics,
-            columns="metric",
-            aggfunc='first'
-        )
-        .reset_index()
-        .sort_values(["date", "areaCode"], ascending=[False, True])
-        .pipe(format_dtypes, column_types=column_types)
-        .loc[:, [*MetricData.base_metrics, *response_metrics]]
-        .pipe(format_msoas, request=request)
-        .pipe(format_data, response_metrics=response_metrics)
-    )
-
-    return payload
+def process_generic_data(results: Iterable[Record], request: Request) -> ColumnarFrame:
+    return pivot_records(results, request.area_type)
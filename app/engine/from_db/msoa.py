@@ -3,33 +3,70 @@
 # Imports
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
+from csv import reader
+from pathlib import Path
+from typing import Iterable
 
 # 3rd party:
-from pandas import DataFrame, read_csv
+from numpy import array, ndarray, argsort, searchsorted, minimum, asarray
 
 # Internal:
 from app.utils.constants import BASE_DIR
-from app.utils.operations import Request
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
-    'format_msoas'
+    'msoa_relations'
 ]
 
 
 MSOA_RELATIONS_PATH = BASE_DIR.joinpath("static", "msoa_relations.csv")
 
 
-def format_msoas(df: DataFrame, request: Request) -> DataFrame:
-    if request.area_type == "msoa":
-        init_cols = df.columns
-        msoa_relations = read_csv(MSOA_RELATIONS_PATH, index_col=["areaCode"])
+class MsoaRelations:
+    """
+    Lookup of MSOA area codes to the codes and names of their
+    region, UTLA and LTLA.
 
-        df = (
-            df
-            .join(msoa_relations, on=["areaCode"])
-            .loc[:, [*msoa_relations.columns, *init_cols]]
-        )
+    The table is held in fixed-width NumPy arrays, sorted by area code,
+    rather than Python objects. It is therefore loaded once per process
+    and - when the app is preloaded by gunicorn - shared copy-on-write
+    by the workers.
+    """
+    def __init__(self, path: Path):
+        with open(path, newline="") as fp:
+            csv_reader = reader(fp)
+            header = next(csv_reader)
+            columns = list(zip(*csv_reader))
+
+        codes = array(columns[0])
+        order = argsort(codes, kind="stable")
+
+        self.codes: ndarray = codes[order]
+        self.columns: list[str] = header[1:]
+        self.values: dict[str, ndarray] = {
+            name: array(values)[order]
+            for name, values in zip(self.columns, columns[1:])
+        }
+
+    def take(self, area_codes: Iterable[str]) -> dict[str, ndarray]:
+        """
+        Relations for ``area_codes``, as object arrays in the same order.
+        Codes that are not in the table are assigned ``None``.
+        """
+        area_codes = asarray(area_codes, dtype=str)
+
+        positions = minimum(searchsorted(self.codes, area_codes), len(self.codes) - 1)
+        missing = self.codes[positions] != area_codes
+
+        relations = dict()
+        for name, values in self.values.items():
+            column = values[positions].astype(object)
+            column[missing] = None
+            relations[name] = column
+
+        return relations
+
+
+msoa_relations = MsoaRelations(MSOA_RELATIONS_PATH)
 
-    return df
@@ -0,0 +1,115 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import AsyncGenerator, AsyncIterator, TypeVar, Any
+from asyncio import Queue, get_running_loop, gather
+from dataclasses import dataclass, asdict
+from time import perf_counter
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'StageTimings',
+    'prefetch'
+]
+
+
+T = TypeVar("T")
+
+# Marks the end of the stream in the queue.
+_END = object()
+
+
+class _Failure:
+    def __init__(self, err: BaseException):
+        self.err = err
+
+
+@dataclass
+class StageTimings:
+    """
+    Cumulative time (seconds) spent in each stage of a build.
+
+    A build is IO-bound when the consumer spends more time waiting for
+    the next chunk (``consumer_idle``) than formatting chunks (``format``),
+    and CPU-bound otherwise. Time spent by the producer waiting for room
+    in the queue is reported as ``producer_blocked``.
+    """
+    chunks: int = 0
+    fetch: float = 0
+    producer_blocked: float = 0
+    consumer_idle: float = 0
+    format: float = 0
+
+    @property
+    def bound(self) -> str:
+        return "io" if self.consumer_idle >= self.format else "cpu"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            **asdict(self),
+            "bound": self.bound
+        }
+
+
+async def prefetch(source: AsyncIterator[T], timings: StageTimings,
+                   depth: int = Settings.build_queue_depth) -> AsyncGenerator[T, None]:
+    """
+    Consumes ``source`` in a background task and yields its items through
+    a queue of at most ``depth`` items, so that the next item is already
+    being produced whilst the current one is processed by the consumer.
+    """
+    queue = Queue(maxsize=depth)
+
+    async def produce():
+        try:
+            start = perf_counter()
+
+            async for item in source:
+                timings.fetch += perf_counter() - start
+
+                start = perf_counter()
+                await queue.put(item)
+                timings.producer_blocked += perf_counter() - start
+
+                start = perf_counter()
+
+        except Exception as err:
+            await queue.put(_Failure(err))
+            return
+
+        finally:
+            # Closes the source where the consumer has stopped, so that
+            # it releases its resources (e.g. DB connections) right away
+            # rather than once it is garbage collected.
+            if (aclose := getattr(source, "aclose", None)) is not None:
+                await aclose()
+
+        await queue.put(_END)
+
+    producer = get_running_loop().create_task(produce())
+
+    try:
+        while True:
+            start = perf_counter()
+            item = await queue.get()
+            timings.consumer_idle += perf_counter() - start
+
+            if item is _END:
+                break
+            elif isinstance(item, _Failure):
+                raise item.err
+
+            timings.chunks += 1
+            yield item
+
+    finally:
+        producer.cancel()
+        await gather(producer, return_exceptions=True)
@@ -0,0 +1,321 @@
+#!/usr/bin python3
+
+"""
+Long-to-wide pivot of the generic DB queries.
+
+Converts rows of ``(areaType, areaCode, areaName, date, metric, value)``
+into one row per area and date, with one column per metric. Rows and
+metrics are factorised into integer codes, and the values are scattered
+into preallocated, typed column arrays with a null mask.
+
+For each area, date and metric, the first non-null value is used - as
+is the case with ``pivot_table(aggfunc='first')``. Rows without any
+values are excluded.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Iterable, Sequence, NamedTuple, Any
+from itertools import repeat
+from operator import itemgetter, is_not, eq
+
+# 3rd party:
+from numpy import (
+    ndarray, empty, full, ones, zeros, fromiter,
+    unique, lexsort, flatnonzero, where, nan, int32, int64, float64
+)
+from asyncpg import Record
+from orjson import loads
+
+# Internal:
+from app.utils.assets import MetricData
+from .msoa import msoa_relations
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'Column',
+    'RecordChunk',
+    'ColumnarFrame',
+    'factorise_records',
+    'pivot_chunk',
+    'pivot_records'
+]
+
+
+NULL_STRING = "null"
+
+BASE_COLUMNS = ["areaType", "areaCode", "areaName", "date"]
+
+
+class Column(NamedTuple):
+    name: str
+    kind: str          # One of "int", "float", "str", or "object"
+    values: ndarray    # `float64` for "int" and "float", `object` otherwise
+    mask: ndarray      # `True` where the value is null
+
+    def to_objects(self) -> ndarray:
+        """
+        Values as Python objects, with ``None`` for nulls.
+        """
+        if self.kind == "int":
+            # Exported without a trailing `.0`.
+            values = where(self.mask, 0, self.values).astype(int64).astype(object)
+        else:
+            values = self.values.astype(object)
+
+        values[self.mask] = None
+
+        return values
+
+    def take(self, indices: ndarray) -> 'Column':
+        return Column(self.name, self.kind, self.values[indices], self.mask[indices])
+
+
+class RecordChunk(NamedTuple):
+    """
+    Columns of a chunk of generic query results, in a compact form.
+
+    The base (area and date) columns and the metric column are held as
+    integer codes and their unique values, so that the chunk may be sent
+    to a worker process as a few small lists and arrays.
+    """
+    base_codes: dict[str, tuple[ndarray, list[Any]]]
+    metric_codes: ndarray
+    metric_names: list[str]
+    values: list[Any]
+
+
+class ColumnarFrame(NamedTuple):
+    columns: list[Column]
+    n_rows: int
+
+    @property
+    def names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+
+def metric_kind(metric: str) -> str:
+    if metric in MetricData.integer_dtypes:
+        return "int"
+    elif MetricData.generic_dtypes.get(metric) is float:
+        return "float"
+    elif metric in MetricData.string_dtypes:
+        return "str"
+
+    return "object"
+
+
+def parse_json(value: Any) -> Any:
+    if isinstance(value, (str, bytes)):
+        return loads(value)
+
+    return value
+
+
+def to_object_array(values: Iterable[Any], size: int) -> ndarray:
+    # Values are assigned individually: NumPy would otherwise
+    # attempt to broadcast list values into a 2D array.
+    result = empty(size, dtype=object)
+
+    for index, value in enumerate(values):
+        result[index] = value
+
+    return result
+
+
+def convert_values(metric: str, values: list[Any], kind: str) -> tuple[ndarray, ndarray]:
+    """
+    Converts the values of a metric to the typed array for its
+    ``kind``, and returns the array with its null mask.
+    """
+    mask = fromiter(
+        (value is None or value == NULL_STRING for value in values),
+        dtype=bool,
+        count=len(values)
+    )
+
+    if kind in ("int", "float"):
+        converted = fromiter(
+            (nan if is_null else float(value) for value, is_null in zip(values, mask)),
+            dtype=float64,
+            count=len(values)
+        )
+        return converted, mask
+
+    if kind == "str":
+        converted = (None if is_null else str(value).strip('"') for value, is_null in zip(values, mask))
+    elif metric in MetricData.json_dtypes:
+        converted = (None if is_null else parse_json(value) for value, is_null in zip(values, mask))
+    else:
+        converted = (None if is_null else value for value, is_null in zip(values, mask))
+
+    return to_object_array(converted, len(values)), mask
+
+
+def base_column(name: str, values: ndarray) -> Column:
+    mask = fromiter((value is None for value in values), dtype=bool, count=len(values))
+
+    if name == "date":
+        return Column(name, "object", values, mask)
+
+    return Column(name, "str", values, mask)
+
+
+def null_last(value: Any) -> tuple[bool, Any]:
+    return value is None, value
+
+
+def factorise(keys: Sequence[Any], sort: bool = False) -> tuple[ndarray, list[Any]]:
+    """
+    Integer codes for ``keys``, and the unique keys that they refer to.
+
+    Codes are assigned in order of first appearance, or in the sort
+    order of the keys where ``sort`` is set.
+    """
+    uniques = list(dict.fromkeys(keys))
+
+    if sort:
+        uniques.sort(key=null_last)
+
+    lookup = {key: code for code, key in enumerate(uniques)}
+    codes = fromiter(map(lookup.__getitem__, keys), dtype=int32, count=len(keys))
+
+    return codes, uniques
+
+
+def sort_rows(date_rank: ndarray, area_code_rank: ndarray) -> ndarray:
+    """
+    Order of rows by ``date`` (descending) and ``areaCode`` (ascending).
+    """
+    # The last key is the primary key.
+    return lexsort((area_code_rank, -date_rank))
+
+
+def empty_frame(area_type: str) -> ColumnarFrame:
+    names = MetricData.base_metrics
+
+    if area_type == "msoa":
+        names = [*msoa_relations.columns, *names]
+
+    columns = [
+        Column(name, "object" if name == "date" else "str", empty(0, dtype=object), ones(0, dtype=bool))
+        for name in names
+    ]
+
+    return ColumnarFrame(columns, 0)
+
+
+def factorise_records(results: Iterable[Record]) -> RecordChunk:
+    results = list(results)
+
+    area_types, area_codes, area_names, dates, metrics, values = (
+        list(map(itemgetter(index), results))
+        for index in range(6)
+    )
+
+    # Each base column is factorised in sort order, so that rows
+    # are ordered as the index of a `pivot_table`. Metrics are
+    # ordered by first appearance.
+    base_codes = {
+        name: factorise(column, sort=True)
+        for name, column in zip(BASE_COLUMNS, (area_types, area_codes, area_names, dates))
+    }
+    metric_codes, metric_names = factorise(metrics)
+
+    return RecordChunk(base_codes, metric_codes, metric_names, values)
+
+
+def pivot_chunk(chunk: RecordChunk, area_type: str) -> ColumnarFrame:
+    n_records = len(chunk.values)
+
+    if not n_records:
+        return empty_frame(area_type)
+
+    values = chunk.values
+    metric_codes, metric_names = chunk.metric_codes, chunk.metric_names
+
+    # Factorising rows (area + date): the codes of the base
+    # columns are combined into one row key.
+    base_codes = dict()
+    row_keys = zeros(n_records, dtype=int64)
+
+    for name, (codes, uniques) in chunk.base_codes.items():
+        base_codes[name] = codes, to_object_array(uniques, len(uniques))
+        row_keys = row_keys * len(uniques) + codes
+
+    _, first_records, row_codes = unique(row_keys, return_index=True, return_inverse=True)
+    row_codes = row_codes.ravel()
+
+    n_rows, n_metrics = len(first_records), len(metric_names)
+
+    # First non-null record for each cell of the wide table. Nulls
+    # are `None` / `NaN` - the `"null"` string is only treated as
+    # such once the cell has been selected.
+    not_null = flatnonzero(
+        fromiter(map(is_not, values, repeat(None)), dtype=bool, count=n_records) &
+        fromiter(map(eq, values, values), dtype=bool, count=n_records)
+    )
+    cells = row_codes[not_null] * n_metrics + metric_codes[not_null]
+    cells, first_index = unique(cells, return_index=True)
+    selected = not_null[first_index]
+
+    has_values = zeros(n_rows, dtype=bool)
+    has_values[cells // n_metrics] = True
+
+    cell_rows = row_codes[selected]
+    cell_metrics = metric_codes[selected]
+
+    metric_columns = list()
+
+    for metric_code, metric in enumerate(metric_names):
+        in_metric = cell_metrics == metric_code
+        rows = cell_rows[in_metric]
+        kind = metric_kind(metric)
+
+        converted, null_values = convert_values(
+            metric,
+            [values[index] for index in selected[in_metric].tolist()],
+            kind
+        )
+
+        if kind in ("int", "float"):
+            column_values = full(n_rows, nan, dtype=float64)
+        else:
+            column_values = empty(n_rows, dtype=object)
+
+        column_mask = ones(n_rows, dtype=bool)
+
+        column_values[rows] = converted
+        column_mask[rows] = null_values
+
+        metric_columns.append(Column(metric, kind, column_values, column_mask))
+
+    rows = flatnonzero(has_values)
+    row_records = first_records[rows]
+    order = rows[sort_rows(base_codes["date"][0][row_records], base_codes["areaCode"][0][row_records])]
+    order_records = first_records[order]
+
+    base_columns = {
+        name: base_column(name, uniques[codes[order_records]])
+        for name, (codes, uniques) in base_codes.items()
+    }
+    columns = [
+        *(base_columns[name] for name in MetricData.base_metrics),
+        *(column.take(order) for column in metric_columns)
+    ]
+
+    if area_type == "msoa":
+        relations = msoa_relations.take(base_columns["areaCode"].values.astype(str))
+        relation_columns = [
+            Column(name, "str", values, fromiter((value is None for value in values), dtype=bool))
+            for name, values in relations.items()
+        ]
+        columns = [*relation_columns, *columns]
+
+    return ColumnarFrame(columns, len(order))
+
+
+def pivot_records(results: Iterable[Record], area_type: str) -> ColumnarFrame:
+    return pivot_chunk(factorise_records(results), area_type)
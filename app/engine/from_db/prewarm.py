@@ -0,0 +1,203 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Iterator, Union
+from asyncio import Task, Semaphore, sleep, gather, get_running_loop
+from contextlib import contextmanager
+from functools import partial
+from itertools import product
+from json import loads
+from urllib.parse import urlencode
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+from time import perf_counter
+from logging import getLogger
+
+# 3rd party:
+from orjson import dumps
+from starlette.datastructures import URL
+
+# Internal:
+from app.config import Settings
+from app.exceptions import NotAvailable
+from app.utils.operations import Request
+from app.utils.assets import RequestMethod
+from app.caching import single_flight
+from .base import ensure_cached
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'PrewarmScheduler',
+    'prewarm_scheduler'
+]
+
+
+logger = getLogger("app")
+
+
+def parse_targets(raw: str) -> list[tuple[str, tuple[str, ...], str]]:
+    """
+    Expands the targets - e.g.::
+
+        [{"areaType": ["nation", "region"], "metric": [["newCasesByPublishDate"]], "format": ["json", "csv"]}]
+
+    into (area type, metrics, format) combinations.
+    """
+    targets = list()
+
+    for item in loads(raw or "[]"):
+        area_types = item["areaType"]
+        if isinstance(area_types, str):
+            area_types = [area_types]
+
+        metric_sets = item["metric"]
+        if metric_sets and isinstance(metric_sets[0], str):
+            metric_sets = [metric_sets]
+
+        formats = item.get("format", ["json"])
+        if isinstance(formats, str):
+            formats = [formats]
+
+        for area_type, metrics, fmt in product(area_types, metric_sets, formats):
+            target = (area_type, tuple(metrics), fmt)
+
+            if target not in targets:
+                targets.append(target)
+
+    return targets
+
+
+def make_request(release: str, area_type: str, metrics: tuple[str, ...], fmt: str) -> Request:
+    params = {"areaType": area_type, "release": release, "metric": metrics, "format": fmt}
+
+    return Request(
+        request=None,
+        area_type=area_type,
+        release=release,
+        format=fmt,
+        metric=list(metrics),
+        area_code=None,
+        method=RequestMethod.Get,
+        url=URL(f"/api/v2/data?{urlencode(params, doseq=True)}")
+    )
+
+
+@contextmanager
+def node_lock(file_path: str) -> Iterator[bool]:
+    """
+    Non-blocking exclusive lock on ``file_path`` - yields ``False``
+    if it is held by another process on this node.
+    """
+    with open(file_path, "a") as fp:
+        try:
+            flock(fp.fileno(), LOCK_EX | LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            flock(fp.fileno(), LOCK_UN)
+
+
+class PrewarmScheduler:
+    """
+    Builds the cache blobs of popular downloads (see
+    ``Settings.prewarm_targets``) when a new release is published,
+    so that the first users after the release don't pay for the
+    builds.
+
+    Only one worker per node runs the builds - elected through a file
+    lock. Builds go through ``ensure_cached``, so requests for the same
+    download coalesce with them, and blobs that are being built (locked)
+    or are already cached by another node are not built again. Builds are
+    rate limited to ``Settings.prewarm_concurrency`` at a time, started
+    at least ``Settings.prewarm_interval`` seconds apart.
+    """
+    def __init__(self, targets: str = Settings.prewarm_targets,
+                 concurrency: int = Settings.prewarm_concurrency,
+                 interval: float = Settings.prewarm_interval,
+                 lock_file: str = Settings.prewarm_lock_file):
+        self.targets = parse_targets(targets)
+        self.concurrency = concurrency
+        self.interval = interval
+        self.lock_file = lock_file
+        self._task: Union[Task, None] = None
+
+    async def on_release(self, timestamp: str):
+        if not self.targets:
+            return
+
+        # Superseded by the new release.
+        await self.stop()
+
+        self._task = get_running_loop().create_task(self.run(timestamp[:10]))
+
+    async def run(self, release: str):
+        try:
+            with node_lock(self.lock_file) as acquired:
+                if not acquired:
+                    return
+
+                await self._run(release)
+        except OSError as err:
+            logger.warning(f"Failed to pre-warm the cache: {err}")
+
+    async def _run(self, release: str):
+        semaphore = Semaphore(self.concurrency)
+        progress = dict(release=release, total=len(self.targets), done=0, failed=0, unavailable=0)
+        start = perf_counter()
+
+        async def build(target):
+            try:
+                request = make_request(release, *target)
+                build_start = perf_counter()
+                await single_flight.run(request.path, partial(ensure_cached, request))
+            except NotAvailable:
+                progress["unavailable"] += 1
+            except Exception as err:
+                progress["failed"] += 1
+                logger.warning(f"Failed to pre-warm {target}: {err}")
+            else:
+                progress["done"] += 1
+                logger.info(dumps({"prewarm": {
+                    **progress,
+                    "path": request.path,
+                    "duration": round(perf_counter() - build_start, 3)
+                }}).decode())
+            finally:
+                semaphore.release()
+
+        logger.info(dumps({"prewarm": {**progress, "status": "started"}}).decode())
+
+        builds = list()
+
+        for index, target in enumerate(self.targets):
+            await semaphore.acquire()
+
+            if index:
+                await sleep(self.interval)
+
+            builds.append(get_running_loop().create_task(build(target)))
+
+        await gather(*builds)
+
+        logger.info(dumps({"prewarm": {
+            **progress,
+            "status": "finished",
+            "duration": round(perf_counter() - start, 3)
+        }}).decode())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        task, self._task = self._task, None
+        task.cancel()
+        await gather(task, return_exceptions=True)
+
+
+prewarm_scheduler = PrewarmScheduler()
@@ -0,0 +1,112 @@
+#!/usr/bin python3
+
+"""
+Serialisation of pivoted chunks (see ``pivot.ColumnarFrame``) to JSON,
+JSONL and CSV.
+
+Rows are written directly from the column arrays, a block at a time,
+rather than through a DataFrame and a list of records for the whole
+chunk. The output is identical to that of ``utils.format_response``.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Iterable, Iterator, Union, Any
+from itertools import repeat
+from csv import writer
+from io import BytesIO, TextIOWrapper
+
+# 3rd party:
+from orjson import dumps
+
+# Internal:
+from app.utils.operations import Request
+from .pivot import Column, ColumnarFrame
+from .utils import csv_columns
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'serialise_frame',
+    'serialise'
+]
+
+
+CSV_FLOAT_FORMAT = "%.1f"
+
+# Rows are converted to Python objects in blocks of this
+# size, so that only one block is held in memory at once.
+ROWS_PER_BLOCK = 256
+
+
+def iter_blocks(frame: ColumnarFrame) -> Iterator[slice]:
+    for start in range(0, frame.n_rows, ROWS_PER_BLOCK):
+        yield slice(start, start + ROWS_PER_BLOCK)
+
+
+def to_records(frame: ColumnarFrame, rows: slice) -> list[dict[str, Any]]:
+    names = frame.names
+    columns = [column.take(rows).to_objects().tolist() for column in frame.columns]
+
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def csv_values(column: Column) -> Iterable[Any]:
+    if column.kind != "float":
+        # Nulls are written as empty fields.
+        return column.to_objects().tolist()
+
+    return (
+        None if is_null else CSV_FLOAT_FORMAT % value
+        for value, is_null in zip(column.values.tolist(), column.mask.tolist())
+    )
+
+
+def to_csv(frame: ColumnarFrame, names: list[str], include_header: bool) -> bytes:
+    columns = {column.name: column for column in frame.columns}
+
+    buffer = BytesIO()
+
+    with TextIOWrapper(buffer, encoding="utf-8", newline="", write_through=True) as text:
+        csv_writer = writer(text, lineterminator="\n")
+
+        if include_header:
+            csv_writer.writerow(names)
+
+        for rows in iter_blocks(frame):
+            values = [
+                csv_values(columns[name].take(rows)) if name in columns else repeat(None)
+                for name in names
+            ]
+            csv_writer.writerows(zip(*values))
+
+        return buffer.getvalue()
+
+
+def serialise_frame(frame: ColumnarFrame, response_type: str, request: Request,
+                    include_header: bool = True) -> bytes:
+    csv_names = csv_columns(request) if response_type == 'csv' else None
+    return serialise(frame, response_type, csv_names, include_header)
+
+
+def serialise(frame: ColumnarFrame, response_type: str, csv_names: Union[list[str], None],
+              include_header: bool = True) -> bytes:
+    """
+    Same as ``serialise_frame``, without the request - ``csv_names``
+    are the columns of CSV responses, see ``utils.csv_columns``.
+    """
+    if response_type == 'csv':
+        return to_csv(frame, csv_names, include_header)
+
+    blocks = (to_records(frame, rows) for rows in iter_blocks(frame))
+
+    if response_type == 'jsonl':
+        jsonl_blocks = (bytes.join(b"\n", map(dumps, records)) for records in blocks)
+        return bytes.join(b"\n", jsonl_blocks) + b"\n"
+
+    # Remove brackets: for JSON response, leading and
+    # trailing brackets must be added later as a part
+    # of the streaming process.
+    json_blocks = (memoryview(dumps(records))[1:-1] for records in blocks)
+    return bytes.join(b",", json_blocks)
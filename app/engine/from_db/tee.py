@@ -0,0 +1,148 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import AsyncGenerator, Awaitable
+from asyncio import Queue, get_running_loop, shield
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+from app.utils.operations import Request
+from app.storage import AsyncStorageClient
+from .assembly import ResponseAssembler, ChunkProducer
+from .pipeline import _END, _Failure
+from .utils import response_framing
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'TeeStream'
+]
+
+
+# Marks the point from which a detached client
+# is streamed the response from the cache blob.
+_DETACHED = object()
+
+BLOB_CHUNK_SIZE = 4 * 1024 ** 2  # 4 MB
+
+
+class TeeStream:
+    """
+    Copy of a response, for the client, as it is being built and
+    written to the cache.
+
+    The chunks produced for the cache (see ``wrap``) are assembled
+    again for the client, in the same way, and the bytes are queued
+    to be streamed by ``body``. A slow client never holds back the
+    build: once more than ``max_buffer`` bytes are queued, the client
+    is detached and the build carries on without it. The rest of the
+    response is then streamed to the client from the cache blob, from
+    where it left off, once the blob has been published - or the
+    response is aborted if the build fails.
+
+    ``ready`` is resolved once the response contains any data - so
+    that responses without any data may still fail with an error.
+    """
+    def __init__(self, request: Request, max_buffer: int = Settings.cache_tee_max_buffer):
+        prefix, suffix, delimiter = response_framing(request)
+
+        self.path = request.path
+        self.max_buffer = max_buffer
+        self.detached = False
+        self._buffered = 0
+        self._size = 0
+        self._sent = 0
+        self._queue = Queue()
+        self._assembler = ResponseAssembler(self._put, prefix, suffix, delimiter)
+        self.ready = get_running_loop().create_future()
+
+    def _detach(self, item):
+        self.detached = True
+
+        # The queued data are dropped - the stream
+        # carries on from ``item`` instead.
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+        self._buffered = 0
+        self._queue.put_nowait(item)
+
+    async def _put(self, data: bytes):
+        # Size of the response - and of the cache blob.
+        self._size += len(data)
+
+        if not data or self.detached:
+            return
+
+        if self._buffered + len(data) > self.max_buffer:
+            self._detach(_DETACHED)
+            return
+
+        self._buffered += len(data)
+        self._queue.put_nowait(data)
+
+    def wrap(self, func: ChunkProducer) -> ChunkProducer:
+        async def produce(**kwargs) -> AsyncGenerator[tuple[int, bytes], None]:
+            try:
+                async for index, item in func(**kwargs):
+                    await self._assembler.add(index, item)
+
+                    # Detached clients are not streamed the response.
+                    if self._assembler.has_data and not (self.ready.done() or self.detached):
+                        self.ready.set_result(True)
+
+                    yield index, item
+
+                await self._assembler.finalise()
+
+            except BaseException as err:
+                # Incl. `GeneratorExit` - when the build is aborted. Detached
+                # clients are given the error of the build instead.
+                if not self.detached:
+                    self._detach(_Failure(err))
+                raise
+
+            finally:
+                if not self.detached:
+                    self._queue.put_nowait(_END)
+
+        return produce
+
+    async def body(self, build: Awaitable) -> AsyncGenerator[bytes, None]:
+        """
+        Streams the response - ``build`` is awaited before a
+        detached client is streamed the rest from the cache blob.
+        """
+        while True:
+            item = await self._queue.get()
+
+            if item is _END:
+                return
+            elif isinstance(item, _Failure):
+                raise item.err
+            elif item is _DETACHED:
+                break
+
+            self._buffered -= len(item)
+            self._sent += len(item)
+            yield item
+
+        # Raises the exception if the build has failed - so the
+        # response is aborted rather than cut short. The build
+        # carries on if the client disconnects in the meantime.
+        await shield(build)
+
+        async with AsyncStorageClient(container="apiv2cache", path=self.path) as blob_client:
+            while self._sent < self._size:
+                length = min(BLOB_CHUNK_SIZE, self._size - self._sent)
+                data = await blob_client.download_range(self._sent, length)
+
+                if not data:
+                    raise IOError(f"Cache blob '{self.path}' is shorter than the response.")
+
+                self._sent += len(data)
+                yield data
@@ -3,168 +3,196 @@
 # Imports
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # Python:
-from typing import Dict, Iterable
+from typing import AsyncIterator
 from tempfile import NamedTemporaryFile
 
 # 3rd party:
 from pandas import DataFrame
-from orjson import dumps, loads
+from orjson import dumps
 
 # Internal:
+from app.config import Settings
 from app.exceptions import NotAvailable
 from app.storage import AsyncStorageClient
 from app.utils.operations import Request
 from app.utils.assets import MetricData
+from app.caching import lock_backend
+from .assembly import ResponseAssembler
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 __all__ = [
-    'format_dtypes',
-    'format_data',
+    'csv_columns',
+    'csv_header',
     'format_response',
-    'cache_response'
+    'response_framing',
+    'cache_response',
+    'BuildStatus',
+    'AlreadyCached'
 ]
 
 
-async def cache_response(func, *, request: Request, **kwargs) -> bool:
-    kws = {
-        "container": "apiv2cache",
-        "path": request.path,
-        "compressed": False,
-        "cache_control": "max-age=90, s-maxage=300",
-        "content_type": request.content_type,
-        "content_disposition":
-            f'attachment; filename="{request.area_type}_{request.release:%Y-%m-%d}.'
-            f'{request.format if request.format != "xml" else "json"}"',
+class BuildStatus:
+    # Stored as "status" in the metadata of cache blobs.
+    done = "done"
 
-    }
 
-    prefix, suffix, delimiter = b"", b"", b""
+class AlreadyCached(Exception):
+    """
+    The cache blob was published by another build whilst
+    waiting for the lock.
+    """
 
-    if request.format in ['json', 'xml']:
-        prefix, suffix, delimiter = b'{"body":[', b']}', b','
 
-    current_location = 0
+async def write_tempfile(chunks: AsyncIterator[tuple[int, bytes]], blob_client: AsyncStorageClient,
+                         prefix: bytes, suffix: bytes, delimiter: bytes, metadata: dict[str, str]):
+    """
+    Writes the response into a temporary file, and uploads
+    the file - with ``metadata`` - once complete.
+    """
+    with NamedTemporaryFile() as fp:
+        async def write(data: bytes):
+            fp.write(data)
 
-    async with AsyncStorageClient(**kws) as blob_client:
-        try:
-            # Create an empty blob
-            await blob_client.upload(b"")
-            await blob_client.set_tags({"done": "0", "in_progress": "1"})
+        assembler = ResponseAssembler(write, prefix, suffix, delimiter)
 
-            with NamedTemporaryFile() as fp:
-                async with blob_client.lock_file(15) as lock:
-                    async for index, item in func(request=request, **kwargs):
-                        if not (index and current_location):
-                            fp.write(prefix)
-                            fp.write(item)
+        async for index, item in chunks:
+            await assembler.add(index, item)
 
-                        elif not index and current_location:
-                            fp.seek(0)
-                            tmp = item + fp.read()
-                            fp.seek(0)
-                            fp.truncate(0)
-                            fp.write(tmp)
+        # Responses without any data won't be cached.
+        if not assembler.has_data:
+            raise NotAvailable()
 
-                        elif item:
-                            fp.write(delimiter)
-                            fp.write(item)
+        await assembler.finalise()
+        fp.seek(0)
 
-                        current_location = fp.tell()
+        await blob_client.upload(fp.read(), metadata=metadata)
 
-                        # Renew the lease by after each
-                        # iteration as some processes may
-                        # take longer.
-                        await lock.renew()
 
-                    fp.write(suffix)
-                    fp.seek(0)
+async def write_staged(chunks: AsyncIterator[tuple[int, bytes]], blob_client: AsyncStorageClient,
+                       prefix: bytes, suffix: bytes, delimiter: bytes, metadata: dict[str, str]):
+    """
+    Uploads the response in blocks, whilst it is being built, and
+    commits the blocks - with ``metadata`` - once complete.
+    """
+    uploader = blob_client.block_uploader(
+        block_size=Settings.cache_block_size,
+        max_in_flight=Settings.cache_upload_concurrency
+    )
 
-                    # Anything below 40 bytes won't contain any
-                    # data and won't be cached.
-                    if fp.tell() == 40:
-                        raise NotAvailable()
+    assembler = ResponseAssembler(uploader.write, prefix, suffix, delimiter)
 
-                    await blob_client.upload(fp.read())
+    try:
+        async for index, item in chunks:
+            await assembler.add(index, item)
 
-                    tags = request.metric_tag
-                    tags["done"] = "1"
-                    tags["in_progress"] = "0"
-                    await blob_client.set_tags(tags)
+        # Responses without any data won't be cached.
+        if not assembler.has_data:
+            raise NotAvailable()
 
-        except Exception as err:
-            # Remove the blob on exception - data may be incomplete.
-            if await blob_client.exists():
-                await blob_client.delete()
-            raise err
+        await assembler.finalise()
+        await uploader.commit(metadata=metadata)
 
-    # return responder
-    return True
+    except BaseException:
+        await uploader.abort()
+        raise
 
 
-def format_dtypes(df: DataFrame, column_types: Dict[str, object]) -> DataFrame:
-    json_columns = MetricData.json_dtypes.intersection(column_types)
+def response_framing(request: Request) -> tuple[bytes, bytes, bytes]:
+    """
+    Prefix, suffix and delimiter of the chunks of a response.
+    """
+    prefix, suffix, delimiter = b"", b"", b""
 
-    # Replace `null` string with None. This happens because
-    # some DB queries convert `null` to `"null"` for type
-    # consistency.
-    df = df.replace('null', None)
-    df.loc[:, json_columns] = (
-        df
-        .loc[:, json_columns]
-        .apply(lambda column: column.map(loads))
-    )
+    if request.format in ['json', 'xml']:
+        prefix, suffix, delimiter = b'{"body":[', b']}', b','
+    elif request.format == 'csv':
+        # Chunks are produced without the header.
+        prefix = csv_header(request)
 
-    return df.astype(column_types)
+    return prefix, suffix, delimiter
 
 
-def format_data(df: DataFrame, response_metrics: Iterable[str]) -> DataFrame:
-    int_response_metrics = list(set(response_metrics).intersection(MetricData.integer_dtypes))
-    df.loc[:, int_response_metrics] = df.loc[:, int_response_metrics].astype(object)
+async def cache_response(func, *, request: Request, **kwargs) -> bool:
+    # Raises `AlreadyCached` - without calling `func` - if the
+    # blob has been published by another build in the meantime.
+    kws = {
+        "container": "apiv2cache",
+        "path": request.path,
+        "compressed": False,
+        "cache_control": "max-age=90, s-maxage=300",
+        "content_type": request.content_type,
+        "content_disposition":
+            f'attachment; filename="{request.area_type}_{request.release:%Y-%m-%d}.'
+            f'{request.format if request.format != "xml" else "json"}"',
 
-    # Pandas only supports `float` type for columns with `NaN`.
-    # Convert non-null values int cells to `int`, so that they
-    # won't be exported with a training `.0` in the response.
-    for col in int_response_metrics:
-        notnull = df[col].notnull()
-        df.loc[notnull, col] = df.loc[notnull, col].astype(int)
+    }
 
-    # Replace `NaN` with `None`. The former is exported as `NaN`
-    # in JSON/CSV and is invalid. The latter is exported as `null`
-    # in JSON and an empty field in CSV.
-    df = df.where(df.notnull(), None)
+    prefix, suffix, delimiter = response_framing(request)
+
+    if Settings.cache_upload_mode == "tempfile":
+        write_response = write_tempfile
+    else:
+        write_response = write_staged
+
+    # Raises `LockNotAcquired` if another build holds the lock.
+    lock = lock_backend.lock(request.path)
+    await lock.acquire()
+
+    try:
+        async with AsyncStorageClient(**kws) as blob_client:
+            # Another build may have published the blob and released
+            # the lock since the blob was last probed.
+            state = await blob_client.cache_state()
+            if state.exists and state.status == BuildStatus.done:
+                raise AlreadyCached()
+
+            # The blob is published in full by a single request - the
+            # final upload or block list commit - so readers never see
+            # it whilst it is being built.
+            chunks = func(request=request, **kwargs)
+            await write_response(
+                chunks, blob_client, prefix, suffix, delimiter,
+                metadata={"status": BuildStatus.done}
+            )
 
-    str_response_metrics = list(
-        set(response_metrics)
-        .intersection(MetricData.string_dtypes)
-    )
+            # Status tags are kept for instances that still rely on them.
+            tags = request.metric_tag
+            tags["done"] = "1"
+            tags["in_progress"] = "0"
+            await blob_client.set_tags(tags)
+    finally:
+        await lock.release()
+
+    # return responder
+    return True
+
+
+def csv_columns(request: Request) -> list[str]:
+    base_metrics = ["areaCode", "areaName", "areaType", "date"]
+
+    if request.area_type == "msoa":
+        base_metrics = [
+            "regionCode", "regionName", "UtlaCode", "UtlaName", "LtlaCode", "LtlaName",
+            *base_metrics
+        ]
+
+    if not len(request.nested_metrics):
+        request_metrics = sorted(request.db_metrics)
+        return [*base_metrics, *request_metrics]
+
+    nested_metric = request.nested_metrics[0]
+    return [*base_metrics, *MetricData.nested_struct[nested_metric]]
 
-    df.loc[:, str_response_metrics] = (
-        df
-        .loc[:, str_response_metrics]
-        .apply(lambda column: column.str.strip('"'))
-    )
 
-    return df
+def csv_header(request: Request) -> bytes:
+    return (str.join(",", csv_columns(request)) + "\n").encode()
 
 
 def format_response(df: DataFrame, response_type: str, request: Request,
                     include_header: bool = True) -> bytes:
     if response_type == 'csv':
-        base_metrics = ["areaCode", "areaName", "areaType", "date"]
-
-        if request.area_type == "msoa":
-            base_metrics = [
-                "regionCode", "regionName", "UtlaCode", "UtlaName", "LtlaCode", "LtlaName",
-                *base_metrics
-            ]
-
-        if not len(request.nested_metrics):
-            request_metrics = sorted(request.db_metrics)
-            metrics = [*base_metrics, *request_metrics]
-        else:
-            nested_metric = request.nested_metrics[0]
-            metrics = [*base_metrics, *MetricData.nested_struct[nested_metric]]
+        metrics = csv_columns(request)
 
         for metric in set(metrics) - set(df.columns):
             df = df.assign(**{metric: None})
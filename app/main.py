@@ -7,10 +7,14 @@ import logging
 from typing import Optional, List
 from json import dumps
 from http import HTTPStatus
+from inspect import isasyncgen
 
 # 3rd party:
 from fastapi import Query, Request as APIRequest
-from fastapi.responses import RedirectResponse as APIRedirect, Response as APIResponse
+from fastapi.responses import (
+    RedirectResponse as APIRedirect, Response as APIResponse,
+    StreamingResponse as APIStreamingResponse
+)
 
 # Internal:
 from app.startup import start_app
@@ -53,6 +57,15 @@ async def main(req: APIRequest,
         url=req.url
     )
 
+    # Equivalent requests are redirected to a single URL, so
+    # that the CDN and the cache hold one copy of the response.
+    if not request.is_canonical:
+        return APIRedirect(
+            url=request.canonical_url,
+            status_code=HTTPStatus.MOVED_PERMANENTLY.real,
+            headers={"Cache-Control": "public, max-age=86400"}
+        )
+
     try:
         response = await get_data(request=request)
 
@@ -91,6 +104,13 @@ async def main(req: APIRequest,
             headers=response.headers
         )
 
+    if isasyncgen(response.content):
+        return APIStreamingResponse(
+            response.content,
+            status_code=HTTPStatus.OK.real,
+            headers=response.headers
+        )
+
     return APIResponse(
         response.content,
         status_code=HTTPStatus.OK.real,
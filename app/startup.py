@@ -18,6 +18,12 @@ from app.utils.assets import add_cloud_role_name
 from app.middleware.tracers.starlette import TraceRequestMiddleware
 from app.config import Settings
 from app.exceptions.handlers import exception_handlers
+from app.database import create_pool, close_pool
+from app.utils.areas import area_index
+from app.utils.releases import release_watcher
+from app.engine.from_db.executor import shutdown_executor
+from app.engine.from_db.prewarm import prewarm_scheduler
+from app.caching import build_waiters, disk_cache, memory_cache, negative_cache, fragment_cache
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -41,6 +47,35 @@ logging_instances = [
 ]
 
 
+async def on_startup():
+    # Runs once per (gunicorn) worker.
+    await create_pool()
+
+    try:
+        await area_index.load()
+    except Exception as err:
+        # Area IDs are queried from the DB until the index is loaded.
+        logger.exception(err)
+
+    release_watcher.subscribe(area_index.refresh)
+    release_watcher.subscribe(disk_cache.refresh)
+    release_watcher.subscribe(memory_cache.refresh)
+    release_watcher.subscribe(negative_cache.refresh)
+    release_watcher.subscribe(fragment_cache.refresh)
+    release_watcher.subscribe(prewarm_scheduler.on_release)
+    release_watcher.start()
+
+    build_waiters.start()
+
+
+async def on_shutdown():
+    await release_watcher.stop()
+    await prewarm_scheduler.stop()
+    await build_waiters.stop()
+    shutdown_executor()
+    await close_pool()
+
+
 def start_app():
     middlewares = [
         Middleware(ProxyHeadersMiddleware, trusted_hosts=Settings.service_domain),
@@ -71,7 +106,9 @@ def start_app():
         redoc_url=None,
         openapi_url="/api/v2/openapi.json",
         middleware=middlewares,
-        exception_handlers=exception_handlers
+        exception_handlers=exception_handlers,
+        on_startup=[on_startup],
+        on_shutdown=[on_shutdown]
     )
 
     return app
@@ -5,7 +5,8 @@
 # Python:
 import logging
 from os import getenv
-from typing import Union, NoReturn
+from typing import Union, NoReturn, NamedTuple
+from asyncio import Task, wait, sleep, gather, get_running_loop, FIRST_COMPLETED
 from gzip import compress
 from uuid import uuid4
 from urllib.parse import quote
@@ -14,7 +15,7 @@ from urllib.parse import quote
 from azure.storage.blob import (
     BlobClient, BlobType, ContentSettings,
     StorageStreamDownloader, StandardBlobTier,
-    BlobServiceClient, ContainerClient
+    BlobServiceClient, ContainerClient, BlobBlock
 )
 
 from azure.storage.blob.aio import (
@@ -25,7 +26,7 @@ from azure.storage.blob.aio import (
     BlobLeaseClient as AsyncBlobLeaseClient
 )
 
-from azure.core.exceptions import HttpResponseError
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
 
 # Internal:
 from app.middleware.tracers.utils import trace_async_method_operation
@@ -36,6 +37,9 @@ from app.middleware.tracers.utils import trace_async_method_operation
 __all__ = [
     "StorageClient",
     "AsyncStorageClient",
+    "AsyncBlockUploader",
+    "AsyncLockBlob",
+    "CacheState",
     "BlobType"
 ]
 
@@ -244,6 +248,13 @@ class StorageClient:
     __repr__ = __str__
 
 
+class CacheState(NamedTuple):
+    exists: bool
+    leased: bool
+    # Build status, as stored in the metadata of the blob.
+    status: Union[str, None]
+
+
 class AsyncLockBlob:
     _name = "Azure Blob"
 
@@ -252,6 +263,7 @@ class AsyncLockBlob:
         self._duration = duration
         self.id = str(uuid4())
         self._lock = AsyncBlobLeaseClient(self._client, lease_id=self.id)
+        self._keep_alive: Union[Task, None] = None
 
         self.account_name = self._client.account_name
         self.target = self._client.primary_hostname
@@ -276,8 +288,9 @@ class AsyncLockBlob:
         action="release_lock",
         operation="PUT"
     )
-    def release(self):
-        return self._lock.release()
+    async def release(self):
+        await self.stop_renewal()
+        return await self._lock.release()
 
     @trace_async_method_operation(
         "container", "path", "target",
@@ -286,8 +299,14 @@ class AsyncLockBlob:
         action="set_lock",
         operation="PUT"
     )
-    def acquire(self):
-        return self._lock.acquire(self._duration)
+    async def acquire(self):
+        response = await self._lock.acquire(self._duration)
+
+        # Infinite leases (-1) need not be renewed.
+        if self._duration > 0:
+            self._keep_alive = get_running_loop().create_task(self._renew_periodically())
+
+        return response
 
     @trace_async_method_operation(
         "container", "path", "target",
@@ -299,6 +318,33 @@ class AsyncLockBlob:
     def renew(self):
         return self._lock.renew()
 
+    async def _renew_periodically(self):
+        """
+        Renews the lease in the background - three times per lease
+        period, so that a failed renewal may be retried in time.
+        """
+        interval = self._duration / 3
+
+        while True:
+            await sleep(interval)
+
+            try:
+                await self.renew()
+            except Exception as err:
+                logger.warning(f"Failed to renew the lease on '{self._client.blob_name}': {err}")
+
+    async def stop_renewal(self):
+        """
+        Stops renewing the lease - e.g. before the blob is deleted,
+        which ends the lease.
+        """
+        if self._keep_alive is None:
+            return
+
+        task, self._keep_alive = self._keep_alive, None
+        task.cancel()
+        await gather(task, return_exceptions=True)
+
 
 class AsyncStorageClient:
     _name = "Azure blob"
@@ -380,6 +426,29 @@ class AsyncStorageClient:
     async def exists(self):
         return await self.client.exists()
 
+    @trace_async_method_operation(
+        "container", "path", "target", "url",
+        name="account_name",
+        dep_type="_name",
+        action="cache_state",
+        operation="HEAD"
+    )
+    async def cache_state(self) -> CacheState:
+        """
+        Existence, lease and build status of the blob - from
+        a single request for its properties.
+        """
+        try:
+            props = await self.client.get_blob_properties()
+        except ResourceNotFoundError:
+            return CacheState(exists=False, leased=False, status=None)
+
+        return CacheState(
+            exists=True,
+            leased=props.lease.status == "locked",
+            status=(props.metadata or dict()).get("status")
+        )
+
     @trace_async_method_operation(
         "container", "path", "target", "url",
         name="account_name",
@@ -388,7 +457,8 @@ class AsyncStorageClient:
         operation="DELETE"
     )
     async def delete(self):
-        response = await self.client.delete_blob()
+        # Leased blobs may only be deleted by the holder of the lease.
+        response = await self.client.delete_blob(lease=self._lock)
         return response
 
     def lock_file(self, duration):
@@ -414,7 +484,8 @@ class AsyncStorageClient:
         operation="PUT"
     )
     async def upload(self, data: Union[str, bytes], overwrite: bool = True,
-                     blob_type: BlobType = BlobType.BlockBlob) -> NoReturn:
+                     blob_type: BlobType = BlobType.BlockBlob,
+                     metadata: Union[dict[str, str], None] = None) -> NoReturn:
         """
         Uploads blob data to the storage.
 
@@ -428,6 +499,9 @@ class AsyncStorageClient:
 
         blob_type: BlobType
 
+        metadata: Union[dict[str, str], None]
+            Metadata of the blob - replaces any existing metadata.
+
         Returns
         -------
         NoReturn
@@ -441,9 +515,6 @@ class AsyncStorageClient:
         if blob_type == BlobType.BlockBlob:
             kwargs['standard_blob_tier'] = self._tier
 
-        if self._lock:
-            await self._lock.renew()
-
         upload = self.client.upload_blob(
             data=prepped_data,
             blob_type=blob_type,
@@ -452,6 +523,7 @@ class AsyncStorageClient:
             timeout=60,
             max_concurrency=10,
             lease=self._lock,
+            metadata=metadata,
             **kwargs
         )
 
@@ -492,9 +564,6 @@ class AsyncStorageClient:
         else:
             prepped_data = data
 
-        if self._lock is not None:
-            await self._lock.renew()
-
         upload = self.client.append_block(
             prepped_data,
             lease=self._lock,
@@ -503,6 +572,60 @@ class AsyncStorageClient:
 
         return await upload
 
+    @trace_async_method_operation(
+        "container", "path", "target", "url",
+        name="account_name",
+        dep_type="_name",
+        action="stage_block",
+        operation="PUT"
+    )
+    async def stage_block(self, block_id: str, data: Union[str, bytes]):
+        """
+        Uploads a block of data, to be committed to the blob
+        by ``commit_block_list``.
+        """
+        if self.compressed:
+            prepped_data = compress(data.encode() if isinstance(data, str) else data)
+        else:
+            prepped_data = data
+
+        staging = self.client.stage_block(
+            block_id,
+            prepped_data,
+            lease=self._lock,
+            timeout=60
+        )
+
+        return await staging
+
+    @trace_async_method_operation(
+        "container", "path", "target", "url",
+        name="account_name",
+        dep_type="_name",
+        action="commit_block_list",
+        operation="PUT"
+    )
+    async def commit_block_list(self, block_ids: list[str],
+                                metadata: Union[dict[str, str], None] = None):
+        """
+        Replaces the content of the blob with the staged
+        blocks - in the order of ``block_ids`` - and its
+        metadata with ``metadata``.
+        """
+        commit = self.client.commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=self._content_settings,
+            standard_blob_tier=self._tier,
+            lease=self._lock,
+            metadata=metadata,
+            timeout=60
+        )
+
+        return await commit
+
+    def block_uploader(self, block_size: int, max_in_flight: int) -> 'AsyncBlockUploader':
+        return AsyncBlockUploader(self, block_size, max_in_flight)
+
     @trace_async_method_operation(
         "container", "path", "target", "url",
         name="account_name",
@@ -515,6 +638,17 @@ class AsyncStorageClient:
         logging.info(f"Downloaded blob '{self.container}/{self.path}'")
         return data
 
+    @trace_async_method_operation(
+        "container", "path", "target", "url",
+        name="account_name",
+        dep_type="_name",
+        action="download range",
+        operation="GET"
+    )
+    async def download_range(self, offset: int, length: int) -> bytes:
+        data = await self.client.download_blob(offset=offset, length=length, max_concurrency=1)
+        return await data.readall()
+
     @trace_async_method_operation(
         "container", "path", "target", "url",
         name="account_name",
@@ -578,10 +712,103 @@ class AsyncStorageClient:
         operation="PUT"
     )
     async def set_tags(self, tags: dict[str, str]):
-        if self._lock is not None:
-            await self._lock.renew()
-
         try:
             return await self.client.set_blob_tags(tags, lease=self._lock)
         except HttpResponseError:
             logger.warning("Failed to create tags.")
+
+    @trace_async_method_operation(
+        "container", "path", "target", "url",
+        name="account_name",
+        dep_type="_name",
+        action="get tags",
+        operation="GET"
+    )
+    async def get_tags(self) -> Union[dict[str, str], None]:
+        """
+        Tags of the blob, or ``None`` if the blob does not exist.
+        """
+        try:
+            return await self.client.get_blob_tags()
+        except ResourceNotFoundError:
+            return None
+
+
+class AsyncBlockUploader:
+    """
+    Streams data into a block blob.
+
+    Data are buffered into blocks of at least ``block_size`` bytes. Each
+    block is staged as soon as it is filled, whilst more data are being
+    written - with up to ``max_in_flight`` blocks being staged at once.
+    The blocks are then committed, in order, by ``commit``.
+
+    Neither the buffer nor the blocks in flight are ever larger than
+    ``block_size * (max_in_flight + 1)`` bytes in total.
+    """
+    def __init__(self, client: AsyncStorageClient, block_size: int, max_in_flight: int):
+        self._client = client
+        self._block_size = block_size
+        self._max_in_flight = max_in_flight
+        self._buffer = bytearray()
+        self._block_ids: list[str] = list()
+        self._prefix = uuid4().hex
+        self._pending: set[Task] = set()
+        self._staged_size = 0
+
+    @property
+    def size(self) -> int:
+        """
+        Number of bytes written to the uploader so far.
+        """
+        return self._staged_size + len(self._buffer)
+
+    async def write(self, data: bytes):
+        self._buffer += data
+
+        if len(self._buffer) >= self._block_size:
+            await self._stage()
+
+    async def _stage(self):
+        if not self._buffer:
+            return
+
+        while len(self._pending) >= self._max_in_flight:
+            done, self._pending = await wait(self._pending, return_when=FIRST_COMPLETED)
+
+            for task in done:
+                # Raises the exception of failed blocks.
+                task.result()
+
+        # IDs must have the same length in each blob - and are unique
+        # to the uploader, so that uncommitted blocks left behind by
+        # other uploads of the blob are never committed with it.
+        block_id = f"{self._prefix}{len(self._block_ids):08d}"
+        data, self._buffer = bytes(self._buffer), bytearray()
+
+        self._block_ids.append(block_id)
+        self._staged_size += len(data)
+
+        task = get_running_loop().create_task(self._client.stage_block(block_id, data))
+        self._pending.add(task)
+
+    async def commit(self, metadata: Union[dict[str, str], None] = None):
+        await self._stage()
+
+        # Failed blocks remain pending, to be cancelled by `abort`.
+        await gather(*self._pending)
+        self._pending = set()
+
+        return await self._client.commit_block_list(self._block_ids, metadata=metadata)
+
+    async def abort(self):
+        """
+        Cancels the blocks in flight. Blocks that are never
+        committed are discarded by the storage service.
+        """
+        pending, self._pending = self._pending, set()
+
+        for task in pending:
+            task.cancel()
+
+        await gather(*pending, return_exceptions=True)
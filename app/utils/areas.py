@@ -0,0 +1,114 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import NamedTuple, Union
+from collections import defaultdict
+from logging import getLogger
+from json import dumps
+
+# 3rd party:
+
+# Internal:
+from app.database import Connection
+from . import constants as const
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'Area',
+    'AreaIndex',
+    'area_index'
+]
+
+
+logger = getLogger("app")
+
+
+class Area(NamedTuple):
+    id: int
+    type: str
+    code: str
+    name: str
+
+
+class AreaTables(NamedTuple):
+    areas: dict[int, Area]
+    ids_by_type: dict[str, list[int]]
+    id_by_code_type: dict[tuple[str, str], int]
+    id_by_code: dict[str, int]
+    parents: dict[int, tuple[int, ...]]
+
+
+class AreaIndex:
+    """
+    In-memory copy of the area dimension (``covid19.area_reference`` and
+    ``covid19.area_relation``), held by each worker.
+
+    Where an area code has more than one ID, the smallest ID is used - as
+    is the case in the ``DBQueries.area_id_by_*`` queries.
+    """
+    def __init__(self):
+        self._tables: Union[AreaTables, None] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._tables is not None
+
+    async def load(self):
+        async with Connection() as conn:
+            areas = await conn.fetch(const.DBQueries.area_reference)
+            relations = await conn.fetch(const.DBQueries.area_relation)
+
+        id_by_code_type = dict()
+        id_by_code = dict()
+
+        for area_id, area_type, area_code, _ in areas:
+            key = (area_code, area_type)
+            id_by_code_type[key] = min(area_id, id_by_code_type.get(key, area_id))
+            id_by_code[area_code] = min(area_id, id_by_code.get(area_code, area_id))
+
+        ids_by_type = defaultdict(list)
+        for (area_code, area_type), area_id in sorted(id_by_code_type.items()):
+            ids_by_type[area_type].append(area_id)
+
+        parents = defaultdict(list)
+        for parent_id, child_id in relations:
+            parents[child_id].append(parent_id)
+
+        # Replaced in one go so that lookups never
+        # see a partially loaded index.
+        self._tables = AreaTables(
+            areas={area_id: Area(area_id, *rest) for area_id, *rest in areas},
+            ids_by_type=dict(ids_by_type),
+            id_by_code_type=id_by_code_type,
+            id_by_code=id_by_code,
+            parents={child_id: tuple(ids) for child_id, ids in parents.items()}
+        )
+
+        logger.info(dumps({"areaIndex": {"areas": len(areas), "relations": len(relations)}}))
+
+    async def refresh(self, timestamp: str):
+        """
+        Reloads the index - to be called when a new release is published.
+        """
+        await self.load()
+
+    def ids_by_type(self, area_type: str) -> list[int]:
+        return self._tables.ids_by_type.get(area_type, list())
+
+    def id_by_code(self, area_code: str, area_type: Union[str, None] = None) -> Union[int, None]:
+        if area_type is None:
+            return self._tables.id_by_code.get(area_code)
+
+        return self._tables.id_by_code_type.get((area_code, area_type))
+
+    def get(self, area_id: int) -> Union[Area, None]:
+        return self._tables.areas.get(area_id)
+
+    def parents(self, area_id: int) -> tuple[int, ...]:
+        return self._tables.parents.get(area_id, tuple())
+
+
+area_index = AreaIndex()
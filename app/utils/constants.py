@@ -19,6 +19,7 @@ import re
 __all__ = [
     'DBQueries',
     'DATA_TYPES',
+    'AREA_TYPES',
     'ENVIRONMENT',
     'BASE_DIR'
 ]
@@ -219,6 +220,27 @@ WHERE area_code = $1
   AND area_type = $2 
 GROUP BY area_code"""
 
+    area_reference = """\
+SELECT id, area_type, area_code, area_name
+FROM covid19.area_reference"""
+
+    area_relation = """\
+SELECT parent_id, child_id
+FROM covid19.area_relation"""
+
+
+# Area types as they are stored in the DB.
+AREA_TYPES: List[str] = [
+    "overview",
+    "nation",
+    "region",
+    "nhsRegion",
+    "nhsTrust",
+    "utla",
+    "ltla",
+    "msoa"
+]
+
 
 DATA_TYPES: Dict[str, Callable[[str], Any]] = {
     'hash': str,
@@ -9,6 +9,7 @@ from typing import Union, Any, Iterator
 from datetime import date, datetime
 from json import dumps
 from hashlib import blake2b
+from urllib.parse import urlencode
 
 # 3rd party:
 from starlette.datastructures import URL
@@ -18,6 +19,7 @@ from app.exceptions import InvalidQuery, BadRequest, StructureTooLarge
 from .. import constants as const
 from ..assets import RequestMethod, MetricData
 from ..formatters import json_formatter
+from ..areas import area_index
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -31,6 +33,26 @@ logger = getLogger('app')
 ENVIRONMENT = getenv("API_ENV", "PRODUCTION")
 
 
+# Case-insensitive lookups of the canonical names.
+AREA_TYPES = {area_type.lower(): area_type for area_type in const.AREA_TYPES}
+METRICS = {metric.lower(): metric for metric in const.DATA_TYPES}
+
+
+def canonical_metrics(metric: list[str]) -> list[str]:
+    """
+    Metric names - comma-separated or otherwise - in their canonical
+    case, without duplicates, and sorted.
+    """
+    metrics = set()
+
+    for item in metric:
+        for name in item.split(","):
+            if name := name.strip():
+                metrics.add(METRICS.get(name.lower(), name))
+
+    return sorted(metrics)
+
+
 def to_chunks(iterable: list[Any], n_chunk: int) -> Iterator[list[Any]]:
     n_data = len(iterable)
 
@@ -53,6 +75,7 @@ class Request:
     _db_metrics: set[str]
     _nested_metrics: list[str]
     _db_query: str
+    _db_query_key: tuple[str, ...]
 
     _content_types_lookup = {
         'json': 'application/vnd.PHE-COVID19.v2+json; charset=utf-8',
@@ -64,10 +87,9 @@ class Request:
     def __init__(self, request, area_type: str, release: str, format: str, metric: Union[list[str], str],
                  area_code: str, method: str, url: URL):
         self.base_request = request
-        self.area_type = area_type
         self.release = datetime.strptime(release[:10], "%Y-%m-%d").date()
         self.format = format.lower()
-        self.area_code = area_code
+        self.area_code = area_code.upper() if area_code else None
         self.method = method
         self.url = url
         self.content_type = self._content_types_lookup[self.format]
@@ -80,11 +102,14 @@ class Request:
                 )
             )
 
-        if isinstance(metric, list) and len(metric) and ',' in metric[0]:
-            self.metric = metric[0].split(',')
-        elif isinstance(metric, list) and len(metric):
-            self.metric = metric
-        else:
+        self.area_type = AREA_TYPES.get(area_type.lower(), area_type)
+
+        if isinstance(metric, str):
+            metric = [metric]
+
+        self.metric = canonical_metrics(metric or list())
+
+        if not self.metric:
             raise InvalidQuery(details="Invalid metric. Must be one or more metric names.")
 
         if (n_metric := len(self.metric)) > 5:
@@ -117,6 +142,33 @@ class Request:
 
         return self._path
 
+    @property
+    def canonical_query(self) -> str:
+        """
+        Query string that identifies the request - parameters in a fixed
+        order, with canonical values, and the default format omitted.
+        """
+        params = [("areaType", self.area_type)]
+
+        if self.area_code:
+            params.append(("areaCode", self.area_code))
+
+        params.append(("metric", str.join(",", self.metric)))
+        params.append(("release", f"{self.release:%Y-%m-%d}"))
+
+        if self.format != "json":
+            params.append(("format", self.format))
+
+        return urlencode(params, safe=",")
+
+    @property
+    def is_canonical(self) -> bool:
+        return self.url.query == self.canonical_query
+
+    @property
+    def canonical_url(self) -> str:
+        return f"{self.url.path}?{self.canonical_query}"
+
     @property
     def metric_tag(self) -> dict[str, str]:
         metrics = str.join(":", self.metric)
@@ -174,7 +226,36 @@ class Request:
 
         return self._nested_metrics
 
-    async def get_query_area_codes(self, conn):
+    def _indexed_area_ids(self) -> Union[list[tuple[int]], None]:
+        """
+        Area IDs from the in-memory area index, or ``None`` if the
+        index is not available. Mirrors ``get_query_area_codes``.
+        """
+        if not area_index.loaded:
+            return None
+
+        if not self.area_code:
+            area_type = self.area_type if self.area_type != "msoa" else "region"
+            return [(area_id,) for area_id in area_index.ids_by_type(area_type)]
+        elif not self.area_type == 'msoa':
+            area_id = area_index.id_by_code(self.area_code, self.area_type)
+        else:
+            area_id = area_index.id_by_code(self.area_code)
+
+        if area_id is None:
+            return list()
+
+        return [(area_id,)]
+
+    @property
+    def is_unknown_area(self) -> bool:
+        """
+        Whether the requested area code is known not to exist. Always
+        ``False`` when the area index is not available.
+        """
+        return bool(self.area_code) and self._indexed_area_ids() == list()
+
+    async def _fetch_area_ids(self, conn):
         if not self.area_code:
             area_type = self.area_type if self.area_type != "msoa" else "region"
             area_ids = await conn.fetch(const.DBQueries.area_id_by_type, area_type)
@@ -190,6 +271,14 @@ class Request:
                 self.area_code
             )
 
+        return area_ids
+
+    async def get_query_area_codes(self, conn):
+        area_ids = self._indexed_area_ids()
+
+        if area_ids is None:
+            area_ids = await self._fetch_area_ids(conn)
+
         batch_partitions = MetricData.single_partition_types - {"msoa"}
 
         if self.area_code or self.area_type not in batch_partitions:
@@ -218,6 +307,7 @@ class Request:
                     filters=filters,
                     metric_name=self.nested_metrics[0]
                 )
+                query_key = ("nested_array", self.partition_id, filters, self.nested_metrics[0])
             elif self.nested_metrics and len(self.metric) > 1:
                 # When a nested metric is present in `self.metric` and
                 # `self.metric` has more than one metric, the request
@@ -233,17 +323,20 @@ class Request:
             else:
                 # When no nested metric is present in `self.metric`:
                 if self.area_type != "msoa":
-                    query = const.DBQueries.main_data
+                    template_name = "main_data"
                 elif "cases" not in str(self.metric).lower():
-                    query = const.DBQueries.non_nested_object_with_area_code
+                    template_name = "non_nested_object_with_area_code"
                 else:
-                    query = const.DBQueries.nested_object_with_area_code
+                    template_name = "nested_object_with_area_code"
 
+                query = getattr(const.DBQueries, template_name)
                 query = query.substitute(partition=self.partition_id, filters=filters)
+                query_key = (template_name, self.partition_id, filters)
 
         elif self.method == RequestMethod.Head:
             query = const.DBQueries.exists
             query = query.substitute(partition=self.partition_id, filters=filters)
+            query_key = ("exists", self.partition_id, filters)
 
         else:
             raise BadRequest()
@@ -251,5 +344,20 @@ class Request:
         logger.info(dumps({"query": query}))
 
         self._db_query = query
+        self._db_query_key = query_key
 
         return self._db_query
+
+    @property
+    def db_query_key(self) -> tuple[str, ...]:
+        """
+        Identifies the DB query by the template and the substitutions
+        that produce it. Used as the key for prepared statements.
+        """
+        if (db_query_key := getattr(self, '_db_query_key', None)) is not None:
+            return db_query_key
+
+        # Evaluating the query sets the key.
+        _ = self.db_query
+
+        return self._db_query_key
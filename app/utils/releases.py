@@ -0,0 +1,100 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Callable, Awaitable, Union
+from asyncio import Task, sleep, get_running_loop, gather
+from logging import getLogger
+
+# 3rd party:
+
+# Internal:
+from app.config import Settings
+from app.storage import AsyncStorageClient
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'ReleaseWatcher',
+    'release_watcher'
+]
+
+
+logger = getLogger("app")
+
+ReleaseSubscriber = Callable[[str], Awaitable[None]]
+
+
+class ReleaseWatcher:
+    """
+    Watches the timestamp of the latest published release (see
+    ``Settings.latest_published_timestamp``) in the background and
+    notifies the subscribers when a new release is published.
+    """
+    def __init__(self, interval: float = Settings.release_poll_interval):
+        self.interval = interval
+        self.latest: Union[str, None] = None
+        self._subscribers: list[ReleaseSubscriber] = list()
+        self._task: Union[Task, None] = None
+
+    def subscribe(self, callback: ReleaseSubscriber):
+        self._subscribers.append(callback)
+
+    async def get_timestamp(self) -> str:
+        kws = Settings.latest_published_timestamp
+
+        async with AsyncStorageClient(kws["container"], kws["path"]) as blob_client:
+            blob = await blob_client.download()
+            data = await blob.readall()
+
+        return data.decode().strip()
+
+    async def check(self) -> bool:
+        timestamp = await self.get_timestamp()
+
+        if timestamp == self.latest:
+            return False
+
+        previous, self.latest = self.latest, timestamp
+
+        # The first check only establishes the baseline.
+        if previous is None:
+            return False
+
+        logger.info(f"New release published: {timestamp}")
+
+        results = await gather(
+            *(callback(timestamp) for callback in self._subscribers),
+            return_exceptions=True
+        )
+
+        for result in results:
+            if isinstance(result, Exception):
+                logger.exception(result, exc_info=result)
+
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as err:
+                logger.warning(f"Failed to check the latest release: {err}")
+
+            await sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        task, self._task = self._task, None
+        task.cancel()
+        await gather(task, return_exceptions=True)
+
+
+release_watcher = ReleaseWatcher()
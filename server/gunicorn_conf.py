@@ -88,6 +88,11 @@ secure_scheme_headers = {
 
 worker_class = getenv("WORKER_CLASS")
 
+# Loads the app before forking the workers, so that read-only
+# data loaded at import time (e.g. the MSOA relations lookup)
+# is shared copy-on-write between them.
+preload_app = getenv("PRELOAD_APP", "0") == "1"
+
 
 # For debugging and testing
 log_data = {
@@ -105,6 +110,7 @@ log_data = {
     "secure_scheme_headers": secure_scheme_headers,
     "proxy_protocol": proxy_protocol,
     "worker_class": worker_class,
+    "preload_app": preload_app,
     "host": host,
     "port": port,
 }
@@ -0,0 +1,93 @@
+#!/usr/bin python3
+
+"""
+Compares the time taken to pivot and serialise chunks of generic query
+results with the NumPy engine and with the pandas implementation that
+it replaced (see ``tests.legacy``).
+
+Usage::
+
+    python -m tests.bench_pivot [--chunks 20] [--areas 15] [--dates 400] [--repeat 3]
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from random import Random
+from time import perf_counter
+
+# 3rd party:
+
+# Internal:
+from app.engine.from_db.generic import process_generic_data
+from app.engine.from_db.serialiser import serialise_frame
+from . import legacy
+from .test_pivot import METRIC_SETS, metric_value, make_request
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def make_chunk(index: int, n_areas: int, n_dates: int, metrics: list[str]) -> list[tuple]:
+    rng = Random(index)
+    start = date(2020, 1, 30)
+
+    return [
+        ("ltla", f"E{index:04d}{area:04d}", f"Area {area}", f"{start + timedelta(days=day):%Y-%m-%d}",
+         metric, metric_value(metric, rng))
+        for area in range(n_areas)
+        for day in range(n_dates)
+        for metric in metrics
+    ]
+
+
+def run_legacy(chunks, request):
+    for records in chunks:
+        legacy.format_response(legacy.process_generic_data(records, request), request.format, request)
+
+
+def run_numpy(chunks, request):
+    for records in chunks:
+        serialise_frame(process_generic_data(records, request), request.format, request)
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = list()
+
+    for _ in range(repeat):
+        start = perf_counter()
+        func(*args)
+        timings.append(perf_counter() - start)
+
+    return min(timings)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--areas", type=int, default=15)
+    parser.add_argument("--dates", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    metrics = METRIC_SETS[0]
+    chunks = [make_chunk(index, args.areas, args.dates, metrics) for index in range(args.chunks)]
+    n_records = sum(map(len, chunks))
+
+    print(f"{args.chunks} chunks, {n_records:,} records - best of {args.repeat}")
+
+    for response_format in ["json", "csv"]:
+        request = make_request("ltla", metrics, response_format)
+
+        pandas_time = best_of(args.repeat, run_legacy, chunks, request)
+        numpy_time = best_of(args.repeat, run_numpy, chunks, request)
+
+        print(
+            f"{response_format:>5}: pandas {pandas_time:.3f}s, numpy {numpy_time:.3f}s "
+            f"({pandas_time / numpy_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
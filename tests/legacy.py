@@ -0,0 +1,137 @@
+#!/usr/bin python3
+
+"""
+Pandas implementation of the generic pivot, as it was before the NumPy
+engine (see ``app.engine.from_db.pivot``) replaced it. Kept as the
+reference for the parity tests and the benchmark.
+
+Ported to pandas 2+ without changing its behaviour: sets are passed as
+lists to ``.loc``, and columns whose dtype changes are replaced rather
+than assigned in place.
+"""
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from typing import Iterable, Dict
+
+# 3rd party:
+from pandas import DataFrame
+from orjson import dumps, loads
+
+# Internal:
+from app.utils.assets import MetricData
+from app.engine.from_db.msoa import msoa_relations
+from app.engine.from_db.utils import csv_columns
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+__all__ = [
+    'process_generic_data',
+    'format_response'
+]
+
+
+def format_dtypes(df: DataFrame, column_types: Dict[str, object]) -> DataFrame:
+    json_columns = list(MetricData.json_dtypes.intersection(column_types))
+
+    df = df.replace('null', None)
+    df[json_columns] = (
+        df
+        .loc[:, json_columns]
+        .apply(lambda column: column.map(loads))
+    )
+
+    return df.astype(column_types)
+
+
+def format_msoas(df: DataFrame, request) -> DataFrame:
+    if request.area_type == "msoa":
+        init_cols = df.columns
+        relations = msoa_relations.take(df["areaCode"].to_numpy())
+
+        df = (
+            df
+            .assign(**relations)
+            .loc[:, [*msoa_relations.columns, *init_cols]]
+        )
+
+    return df
+
+
+def format_data(df: DataFrame, response_metrics: Iterable[str]) -> DataFrame:
+    int_response_metrics = list(set(response_metrics).intersection(MetricData.integer_dtypes))
+    df[int_response_metrics] = df.loc[:, int_response_metrics].astype(object)
+
+    for col in int_response_metrics:
+        notnull = df[col].notnull()
+        df.loc[notnull, col] = df.loc[notnull, col].astype(int)
+
+    df = df.where(df.notnull(), None)
+
+    str_response_metrics = list(
+        set(response_metrics)
+        .intersection(MetricData.string_dtypes)
+    )
+
+    df[str_response_metrics] = (
+        df
+        .loc[:, str_response_metrics]
+        .apply(lambda column: column.str.strip('"'))
+    )
+
+    return df
+
+
+def process_generic_data(results, request) -> DataFrame:
+    df = DataFrame(results, columns=[*MetricData.base_metrics, "metric", "value"])
+
+    response_metrics = df.metric.unique()
+    column_types = {
+        metric: MetricData.generic_dtypes[metric]
+        for metric in filter(response_metrics.__contains__, MetricData.generic_dtypes)
+    }
+
+    return (
+        df
+        .pivot_table(
+            values="value",
+            index=MetricData.base_metrics,
+            columns="metric",
+            aggfunc='first'
+        )
+        .reset_index()
+        .sort_values(["date", "areaCode"], ascending=[False, True])
+        .pipe(format_dtypes, column_types=column_types)
+        .loc[:, [*MetricData.base_metrics, *response_metrics]]
+        .pipe(format_msoas, request=request)
+        .pipe(format_data, response_metrics=response_metrics)
+    )
+
+
+def format_response(df: DataFrame, response_type: str, request,
+                    include_header: bool = True) -> bytes:
+    if response_type == 'csv':
+        metrics = csv_columns(request)
+
+        for metric in set(metrics) - set(df.columns):
+            df = df.assign(**{metric: None})
+
+        return (
+            df
+            .loc[:, metrics]
+            .to_csv(
+                float_format="%.1f",
+                date_format="iso",
+                index=False,
+                header=include_header
+            )
+            .encode()
+        )
+
+    df_dict = df.to_dict(orient='records')
+
+    if response_type == 'jsonl':
+        return bytes.join(b"\n", list(map(dumps, df_dict))) + b"\n"
+
+    return dumps(df_dict)[1:-1]
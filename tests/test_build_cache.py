@@ -0,0 +1,134 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.caching import LockNotAcquired
+from app.exceptions import NotAvailable
+from app.engine.from_db import base
+from app.engine.from_db.utils import AlreadyCached
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class FakeWaiters:
+    def __init__(self):
+        self.notified = list()
+
+    async def notify(self, key):
+        self.notified.append(key)
+
+
+class FakeDiskCache:
+    def __init__(self):
+        self.entries = dict()
+        self.markers = set()
+
+    @asynccontextmanager
+    async def writer(self, key):
+        parts = list()
+
+        class Writer:
+            async def write(self, data):
+                parts.append(data)
+
+        yield Writer()
+        self.entries[key] = b"".join(parts)
+
+    async def put(self, key, data):
+        self.entries[key] = data
+
+    async def mark(self, key):
+        self.markers.add(key)
+
+
+class FakeMemoryCache:
+    def put(self, key, content):
+        pass
+
+
+class FakeNegativeCache:
+    async def add(self, key):
+        pass
+
+
+@pytest.fixture
+def waiters(monkeypatch):
+    waiters = FakeWaiters()
+    monkeypatch.setattr(base, "build_waiters", waiters)
+    monkeypatch.setattr(base, "disk_cache", FakeDiskCache())
+    monkeypatch.setattr(base, "negative_cache", FakeNegativeCache())
+    monkeypatch.setattr(base, "memory_cache", FakeMemoryCache())
+    return waiters
+
+
+def request_(format="json"):
+    return SimpleNamespace(path=f"2021-03-01/nation/abc.{format}", format=format)
+
+
+def raising(err):
+    async def cache_response(func, *, request):
+        raise err
+
+    return cache_response
+
+
+@pytest.mark.parametrize("err", [LockNotAcquired, AlreadyCached])
+def test_waiters_are_not_notified_without_a_build(monkeypatch, waiters, err):
+    monkeypatch.setattr(base, "cache_response", raising(err()))
+
+    with pytest.raises(err):
+        run(base.build_cache(request_()))
+
+    assert waiters.notified == []
+
+
+@pytest.mark.parametrize("err", [NotAvailable, RuntimeError])
+def test_waiters_are_notified_of_failed_builds(monkeypatch, waiters, err):
+    monkeypatch.setattr(base, "cache_response", raising(err()))
+
+    with pytest.raises(err):
+        run(base.build_cache(request_()))
+
+    assert waiters.notified == [request_().path]
+
+
+def building(chunks):
+    async def process_get_request(**kwargs):
+        for index, chunk in enumerate(chunks):
+            yield index, chunk
+
+    async def cache_response(func, *, request):
+        async for _ in func(request=request):
+            pass
+
+    return process_get_request, cache_response
+
+
+@pytest.mark.parametrize("format, size, stored", [
+    ("json", 10, True),
+    ("json", base.memory_cache.max_item_size + 1, False),
+    ("xml", base.memory_cache.max_item_size + 1, True),
+])
+def test_only_servable_bodies_are_written_to_disk(monkeypatch, waiters, format, size, stored):
+    disk_cache = FakeDiskCache()
+    process_get_request, cache_response = building([b"1" * size])
+
+    monkeypatch.setattr(base, "disk_cache", disk_cache)
+    monkeypatch.setattr(base, "process_get_request", process_get_request)
+    monkeypatch.setattr(base, "cache_response", cache_response)
+
+    request = request_(format)
+    run(base.build_cache(request))
+
+    assert (request.path in disk_cache.entries) is stored
+    assert (request.path in disk_cache.markers) is not stored
+    assert waiters.notified == [request.path]
@@ -0,0 +1,104 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from datetime import datetime
+from types import SimpleNamespace
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.engine.from_db import utils
+from app.engine.from_db.utils import AlreadyCached, BuildStatus, cache_response
+from app.storage import CacheState
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class FakeLock:
+    def __init__(self):
+        self.held = False
+        self.released = False
+
+    async def acquire(self):
+        self.held = True
+
+    async def release(self):
+        self.held = False
+        self.released = True
+
+
+class FakeBlobClient:
+    def __init__(self, state, lock):
+        self.state = state
+        self.lock = lock
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def cache_state(self):
+        # Only probed whilst the lock is held.
+        assert self.lock.held
+        return self.state
+
+
+@pytest.fixture
+def request_():
+    return SimpleNamespace(
+        path="2021-03-01/nation/abc.csv",
+        content_type="text/csv",
+        area_type="nation",
+        release=datetime(2021, 3, 1),
+        format="json",
+        metric_tag=dict(),
+    )
+
+
+def test_returns_early_if_published_whilst_locking(monkeypatch, request_):
+    lock = FakeLock()
+    state = CacheState(exists=True, leased=False, status=BuildStatus.done)
+    calls = list()
+
+    monkeypatch.setattr(utils, "lock_backend", SimpleNamespace(lock=lambda key: lock))
+    monkeypatch.setattr(utils, "AsyncStorageClient", lambda **kws: FakeBlobClient(state, lock))
+
+    def func(**kwargs):
+        calls.append(kwargs)
+
+    with pytest.raises(AlreadyCached):
+        run(cache_response(func, request=request_))
+
+    assert calls == []
+    assert lock.released
+
+
+def test_builds_a_blob_that_is_not_done(monkeypatch, request_):
+    lock = FakeLock()
+    state = CacheState(exists=False, leased=False, status=None)
+    written = list()
+
+    async def write_response(chunks, blob_client, *args, metadata):
+        written.append(metadata)
+
+    async def set_tags(tags):
+        pass
+
+    def client(**kws):
+        blob_client = FakeBlobClient(state, lock)
+        blob_client.set_tags = set_tags
+        return blob_client
+
+    monkeypatch.setattr(utils, "lock_backend", SimpleNamespace(lock=lambda key: lock))
+    monkeypatch.setattr(utils, "AsyncStorageClient", client)
+    monkeypatch.setattr(utils, "write_tempfile", write_response)
+    monkeypatch.setattr(utils, "write_staged", write_response)
+
+    assert run(cache_response(lambda **kwargs: None, request=request_))
+    assert written == [{"status": BuildStatus.done}]
+    assert lock.released
@@ -0,0 +1,85 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from os import listdir, utime
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.caching.disk import DiskCache, TEMP_PREFIX
+from app.utils.releases import release_watcher
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+@pytest.fixture(autouse=True)
+def release(monkeypatch):
+    monkeypatch.setattr(release_watcher, "latest", "2021-03-01T16:00:00")
+
+
+def test_entries_are_stored_and_read(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=1024)
+
+    async def main():
+        await cache.put("a", b"x" * 100)
+        await cache.mark("b")
+
+        assert await cache.get("a") == b"x" * 100
+        assert await cache.get("a", max_size=10) is None
+        assert await cache.get("b") is None
+        assert cache.contains("a") and cache.contains("b") and not cache.contains("c")
+
+    run(main())
+
+
+def test_failed_writes_are_discarded(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=1024)
+
+    async def main():
+        with pytest.raises(ValueError):
+            async with cache.writer("a") as writer:
+                await writer.write(b"partial")
+                raise ValueError()
+
+        assert await cache.get("a") is None
+
+    run(main())
+
+    generation, = listdir(tmp_path)
+    assert not any(name.startswith(TEMP_PREFIX) for name in listdir(tmp_path / generation))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=1000)
+
+    async def main():
+        for index in range(5):
+            await cache.put(str(index), b"x" * 300)
+
+            # Ordered modification times, independent of the clock.
+            utime(cache._entry_path(str(index)), (index, index))
+
+    run(main())
+
+    assert [cache.contains(str(index)) for index in range(5)] == [False, False, True, True, True]
+    assert cache._size <= cache.max_size
+
+
+def test_earlier_releases_are_removed(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_size=1024)
+
+    async def main():
+        await cache.put("a", b"x")
+        monkeypatch.setattr(release_watcher, "latest", "2021-03-02T16:00:00")
+        await cache.put("a", b"y")
+        await cache.refresh(release_watcher.latest)
+
+        assert await cache.get("a") == b"y"
+
+    run(main())
+
+    assert len(listdir(tmp_path)) == 1
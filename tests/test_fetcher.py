@@ -0,0 +1,134 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import Semaphore, sleep, wait_for, gather, run
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from random import Random
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.config import Settings
+from app.engine.from_db import fetcher
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+POOL_SIZE = 5
+POOL_TIMEOUT = 1
+
+REQUEST = SimpleNamespace(db_query_key=("main_data",), db_query="SELECT 1", db_args=())
+
+
+class FakePool:
+    def __init__(self, size: int):
+        self.slots = Semaphore(size)
+        self.in_use = 0
+        self.max_in_use = 0
+
+    async def acquire(self):
+        # Raises `TimeoutError` once exhausted - as the pool does.
+        await wait_for(self.slots.acquire(), POOL_TIMEOUT)
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def release(self):
+        self.in_use -= 1
+        self.slots.release()
+
+
+class FakeConnection:
+    pool: FakePool
+    delays = Random(0)
+    fetched: list
+
+    async def __aenter__(self):
+        await self.pool.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.pool.release()
+
+    async def fetch_prepared(self, key, query, *args):
+        await sleep(self.delays.random() / 100)
+        self.fetched.append(args[-1])
+        return [args[-1]]
+
+    async def execute(self, query, *args):
+        pass
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def fake_pool(monkeypatch):
+    FakeConnection.pool = FakePool(POOL_SIZE)
+    FakeConnection.fetched = list()
+
+    monkeypatch.setattr(fetcher, "Connection", FakeConnection)
+    monkeypatch.setattr(fetcher, "_fetch_slots", None)
+    monkeypatch.setattr(Settings, "db_pool_max_size", POOL_SIZE)
+    monkeypatch.setattr(Settings, "db_fetch_concurrency", 4)
+
+    return FakeConnection.pool
+
+
+async def build(area_codes, snapshot="snapshot"):
+    async with FakeConnection() as conn:
+        return [
+            item
+            async for item in fetcher.fetch_chunks(conn, REQUEST, area_codes, snapshot)
+        ]
+
+
+def test_chunks_are_yielded_in_order():
+    area_codes = list(range(50))
+
+    result = run(build(area_codes))
+
+    assert result == [(index, [code]) for index, code in enumerate(area_codes)]
+    assert sorted(FakeConnection.fetched) == area_codes
+
+
+def test_sequential_without_concurrency(monkeypatch):
+    monkeypatch.setattr(Settings, "db_fetch_concurrency", 1)
+
+    result = run(build(list(range(10))))
+
+    assert result == [(index, [index]) for index in range(10)]
+    assert FakeConnection.pool.max_in_use == 1
+
+
+def test_concurrent_builds_do_not_exhaust_the_pool(fake_pool):
+    area_codes = list(range(20))
+
+    async def main():
+        return await gather(*(build(area_codes) for _ in range(2 * POOL_SIZE)))
+
+    # Builds hold a connection each whilst fetching - extra connections
+    # must never leave them waiting for the pool until it times out.
+    results = run(main())
+
+    expected = [(index, [code]) for index, code in enumerate(area_codes)]
+    assert all(result == expected for result in results)
+    assert fake_pool.max_in_use <= POOL_SIZE
+    assert fake_pool.in_use == 0
+
+
+def test_extra_connections_are_released_when_closed(fake_pool):
+    async def main():
+        async with FakeConnection() as conn:
+            chunks = fetcher.fetch_chunks(conn, REQUEST, list(range(20)), None)
+            first = await chunks.__anext__()
+            await chunks.aclose()
+
+        return first
+
+    assert run(main()) == (0, [0])
+    assert fake_pool.in_use == 0
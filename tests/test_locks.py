@@ -0,0 +1,141 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+
+# 3rd party:
+import pytest
+from azure.core.exceptions import ResourceExistsError
+
+# Internal:
+from app.caching import locks
+from app.caching.locks import BuildLock, LockBackend, LockNotAcquired, BlobLease, advisory_key, lock_id
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def test_base_classes_are_abstract():
+    with pytest.raises(TypeError):
+        BuildLock()
+
+    with pytest.raises(TypeError):
+        LockBackend()
+
+
+@pytest.mark.parametrize("lock_key, expected", [
+    (1, (0, 1)),
+    (2 ** 32 + 5, (1, 5)),
+    (-1, (2 ** 32 - 1, 2 ** 32 - 1)),
+    (-2 ** 63, (2 ** 31, 0)),
+])
+def test_lock_id_matches_pg_locks(lock_key, expected):
+    assert lock_id(lock_key) == expected
+
+
+def test_advisory_keys_are_signed_64_bit():
+    key = advisory_key("2021-03-01/nation/complete/abc.json")
+
+    assert -2 ** 63 <= key < 2 ** 63
+    assert key == advisory_key("2021-03-01/nation/complete/abc.json")
+
+
+class FakeLease:
+    def __init__(self, blobs, path):
+        self.blobs = blobs
+        self.path = path
+        self.renewing = False
+
+    async def acquire(self):
+        if self.path in self.blobs.leased:
+            raise ResourceExistsError()
+
+        self.blobs.leased.add(self.path)
+        self.renewing = True
+
+    async def stop_renewal(self):
+        self.renewing = False
+
+    async def release(self):
+        self.blobs.leased.discard(self.path)
+
+
+class FakeLeaseBlobs:
+    def __init__(self):
+        self.stored = set()
+        self.leased = set()
+        self.leases = list()
+
+    def client(self, key):
+        blobs = self
+        path = f"leases/{key}"
+
+        class Client:
+            def __init__(self):
+                self.path = path
+                self.open = False
+
+            async def __aenter__(self):
+                self.open = True
+                return self
+
+            async def __aexit__(self, *args):
+                self.open = False
+
+            async def upload(self, data, overwrite=True):
+                if not overwrite and path in blobs.stored:
+                    raise ResourceExistsError()
+
+                blobs.stored.add(path)
+
+            async def delete(self):
+                blobs.stored.discard(path)
+                blobs.leased.discard(path)
+
+            def lock_file(self, duration):
+                lease = FakeLease(blobs, path)
+                blobs.leases.append(lease)
+                return lease
+
+        return Client()
+
+
+@pytest.fixture
+def lease_blobs(monkeypatch):
+    blobs = FakeLeaseBlobs()
+    monkeypatch.setattr(locks, "lease_client", blobs.client)
+    return blobs
+
+
+def test_lease_blobs_are_removed_on_release(lease_blobs):
+    async def main():
+        lock = BlobLease("2021-03-01/nation/abc.json", 15)
+        await lock.acquire()
+        assert lease_blobs.stored == lease_blobs.leased == {"leases/2021-03-01/nation/abc.json"}
+
+        await lock.release()
+
+    run(main())
+
+    assert lease_blobs.stored == lease_blobs.leased == set()
+    assert not lease_blobs.leases[0].renewing
+
+
+def test_held_leases_are_not_acquired_twice(lease_blobs):
+    async def main():
+        first = BlobLease("abc.json", 15)
+        await first.acquire()
+
+        with pytest.raises(LockNotAcquired):
+            await BlobLease("abc.json", 15).acquire()
+
+        await first.release()
+
+        second = BlobLease("abc.json", 15)
+        await second.acquire()
+        await second.release()
+
+    run(main())
+
+    assert lease_blobs.stored == set()
@@ -0,0 +1,73 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+
+# 3rd party:
+
+# Internal:
+from app.caching import lru
+from app.caching.lru import ExpiringLRU
+from app.caching.fragments import FragmentCache, pack_fragment, unpack_fragment
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ExpiringLRU(max_size=10, ttl=60, sizeof=len)
+
+    cache.put("a", b"x" * 4)
+    cache.put("b", b"x" * 4)
+    cache.get("a")
+    cache.put("c", b"x" * 4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size == 8
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(lru, "monotonic", lambda: now[0])
+
+    cache = ExpiringLRU(max_size=10, ttl=60)
+    cache.put("a", True)
+    cache.put("b", True, ttl=5)
+
+    now[0] += 10
+    assert cache.get("a") is True
+    assert cache.get("b") is None
+    assert len(cache) == 1
+
+    now[0] += 60
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_fragments_round_trip():
+    records = [
+        ("ltla", "E06000001", "Hartlepool", "2021-03-02", "newCasesByPublishDate", 12),
+        ("ltla", "E06000001", "Hartlepool", "2021-03-02", "femaleCases", [{"age": "0_4", "value": 1}]),
+        ("ltla", "E06000001", "Hartlepool", "2021-03-01", "newCasesByPublishDate", None),
+    ]
+
+    assert unpack_fragment(pack_fragment(records)) == records
+    assert unpack_fragment(pack_fragment([])) == []
+
+
+def test_fragment_cache_is_bounded_in_bytes():
+    records = [
+        ("ltla", f"E0600000{index}", "Area", "2021-03-02", "newCasesByPublishDate", index)
+        for index in range(1)
+    ]
+    size = len(pack_fragment(records))
+    cache = FragmentCache(max_size=size * 8, ttl=60)
+
+    for index in range(20):
+        cache.put(index, records)
+
+    assert cache.size <= size * 8
+    assert cache.get(19) == records
+    assert cache.get(0) is None
+    assert not FragmentCache(max_size=0, ttl=60).enabled
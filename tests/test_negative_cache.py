@@ -0,0 +1,90 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import run
+from time import time
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.caching import negative
+from app.caching.negative import NegativeCache
+from app.utils.releases import release_watcher
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class FakeBlobs:
+    def __init__(self):
+        self.tags = dict()
+        self.requests = list()
+
+    def client(self, container, path, **kwargs):
+        blobs = self
+
+        class Client:
+            async def __aenter__(self):
+                blobs.requests.append(path)
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+            async def upload(self, data):
+                pass
+
+            async def set_tags(self, tags):
+                blobs.tags[path] = tags
+
+            async def get_tags(self):
+                return blobs.tags.get(path)
+
+            async def delete(self):
+                del blobs.tags[path]
+
+        return Client()
+
+
+@pytest.fixture
+def blobs(monkeypatch):
+    fake = FakeBlobs()
+    monkeypatch.setattr(negative, "AsyncStorageClient", fake.client)
+    monkeypatch.setattr(release_watcher, "latest", "2021-03-01T16:00:00")
+    return fake
+
+
+def test_membership_does_not_query_blobs(blobs):
+    cache = NegativeCache(ttl=60, max_entries=10, use_blobs=True)
+
+    assert "a" not in cache
+    assert blobs.requests == []
+
+
+def test_markers_are_shared_within_a_release(blobs, monkeypatch):
+    async def main():
+        await NegativeCache(ttl=60, max_entries=10, use_blobs=True).add("a")
+
+        other = NegativeCache(ttl=60, max_entries=10, use_blobs=True)
+        assert await other.contains("a")
+
+        monkeypatch.setattr(release_watcher, "latest", "2021-03-02T16:00:00")
+        assert not await NegativeCache(ttl=60, max_entries=10, use_blobs=True).contains("a")
+
+    run(main())
+
+    marker, = blobs.tags
+    assert marker == "negative/2021-03-01T16:00:00/a"
+    assert float(blobs.tags[marker]["expires"]) > time()
+
+
+def test_expired_markers_are_deleted(blobs):
+    marker = "negative/2021-03-01T16:00:00/a"
+    blobs.tags[marker] = {"empty": "1", "expires": f"{time() - 1:.0f}"}
+
+    cache = NegativeCache(ttl=60, max_entries=10, use_blobs=True)
+
+    assert not run(cache.contains("a"))
+    assert marker not in blobs.tags
@@ -0,0 +1,53 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from asyncio import sleep, run
+
+# 3rd party:
+
+# Internal:
+from app.engine.from_db.pipeline import prefetch, StageTimings
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def make_source(closed: list):
+    async def source():
+        try:
+            for index in range(100):
+                await sleep(0)
+                yield index
+        finally:
+            closed.append(True)
+
+    return source()
+
+
+def test_items_are_yielded_in_order():
+    closed = list()
+
+    async def main():
+        return [item async for item in prefetch(make_source(closed), StageTimings(), depth=2)]
+
+    assert run(main()) == list(range(100))
+    assert closed == [True]
+
+
+def test_source_is_closed_when_the_consumer_stops():
+    closed = list()
+
+    async def main():
+        items = prefetch(make_source(closed), StageTimings(), depth=2)
+        first = await items.__anext__()
+
+        # Leaves the producer waiting for room in the queue.
+        await sleep(0.01)
+        await items.aclose()
+
+        # Closed without garbage collection.
+        assert closed == [True]
+        return first
+
+    assert run(main()) == 0
@@ -0,0 +1,127 @@
+#!/usr/bin python3
+
+# Imports
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Python:
+from types import SimpleNamespace
+from asyncio import sleep, run, get_running_loop
+
+# 3rd party:
+import pytest
+
+# Internal:
+from app.engine.from_db import tee as tee_module
+from app.engine.from_db.tee import TeeStream
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+REQUEST = SimpleNamespace(format="jsonl", path="2021-03-01/nation/abc.jsonl")
+
+CHUNK = b"x" * 1024
+
+
+async def produce(n_chunks: int, **kwargs):
+    for index in range(n_chunks):
+        await sleep(0)
+        yield index, CHUNK
+
+
+async def build(tee: TeeStream, n_chunks: int) -> int:
+    size = 0
+
+    async for _, item in tee.wrap(produce)(n_chunks=n_chunks):
+        size += len(item)
+
+    return size
+
+
+def done(result=True):
+    future = get_running_loop().create_future()
+    future.set_result(result)
+    return future
+
+
+@pytest.fixture
+def blobs(monkeypatch):
+    blobs = dict()
+
+    class Client:
+        def __init__(self, container, path):
+            self.path = path
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+        async def download_range(self, offset, length):
+            return blobs[self.path][offset:offset + length]
+
+    monkeypatch.setattr(tee_module, "AsyncStorageClient", Client)
+    monkeypatch.setattr(tee_module, "BLOB_CHUNK_SIZE", 3000)
+
+    return blobs
+
+
+def test_client_receives_the_response():
+    async def main():
+        tee = TeeStream(REQUEST, max_buffer=4 * len(CHUNK))
+        await build(tee, 3)
+
+        return [item async for item in tee.body(done())]
+
+    assert bytes.join(b"", run(main())) == CHUNK * 3
+
+
+def test_slow_client_is_detached(blobs):
+    async def main():
+        tee = TeeStream(REQUEST, max_buffer=4 * len(CHUNK))
+        body = tee.body(done())
+        building = get_running_loop().create_task(build(tee, 100))
+
+        # The client falls behind after the first chunk, and the
+        # build completes without the client reading anything else.
+        received = [await body.__anext__()]
+        assert await building == 100 * len(CHUNK)
+        assert tee.detached
+        assert tee._queue.qsize() == 1
+
+        blobs[REQUEST.path] = CHUNK * 100
+        received.extend([item async for item in body])
+
+        return received
+
+    # The rest of the response is streamed from the cache blob.
+    assert bytes.join(b"", run(main())) == CHUNK * 100
+
+
+def test_detached_client_is_aborted_if_the_build_fails(blobs):
+    async def main():
+        tee = TeeStream(REQUEST, max_buffer=4 * len(CHUNK))
+        await build(tee, 100)
+
+        failed = get_running_loop().create_future()
+        failed.set_exception(RuntimeError("upload failed"))
+
+        received = list()
+
+        with pytest.raises(RuntimeError):
+            async for item in tee.body(failed):
+                received.append(item)
+
+        return received
+
+    # No short response - the error is raised instead.
+    assert run(main()) == list()
+
+
+def test_oversized_first_chunk_is_not_streamed():
+    async def main():
+        tee = TeeStream(REQUEST, max_buffer=len(CHUNK) // 2)
+        await build(tee, 1)
+
+        return tee.ready.done()
+
+    assert run(main()) is False